@@ -122,7 +122,7 @@ class RecipesAdmin(admin.ModelAdmin):
         return obj.author.username
 
     def favorite_count(self, obj):
-        return obj.user_recipe.filter(is_favorited=True).count()
+        return obj.favorites_count
 
     author_username.short_description = 'Имя автора'
     favorite_count.short_description = 'В избранном'
@@ -100,7 +100,7 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'user.authentication.CachedTokenAuthentication',
     ),
 
     'DEFAULT_PAGINATION_CLASS': 'user.pagination.UsersPagination',
@@ -155,6 +155,46 @@ EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
 
 AUTH_USER_MODEL = 'user.User'
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND',
+                             'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+RECIPE_FRAGMENT_TIMEOUT = 60 * 60
+
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', 30))
+# 0 отключает общий кэш токенов. Кэш в памяти процесса общим не
+# является, поэтому с ним общий кэш по умолчанию выключен (а включить
+# его не даст user.authentication.shared_ttl).
+PROCESS_LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache',
+                        'django.core.cache.backends.dummy.DummyCache')
+AUTH_TOKEN_SHARED_TTL = int(os.getenv(
+    'AUTH_TOKEN_SHARED_TTL',
+    0 if CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES else 5 * 60))
+
+INGREDIENT_INDEX_PATH = os.getenv('INGREDIENT_INDEX_PATH',
+                                  BASE_DIR / 'data' / 'ingredients.idx')
+
+# У авторов с большим числом подписчиков лента читателя забирает
+# рецепты при чтении, а не получает их при публикации.
+FEED_FANOUT_LIMIT = int(os.getenv('FEED_FANOUT_LIMIT', 10000))
+# Сколько последних рецептов автора попадает в ленту при подписке;
+# миграция recipes 0024 заполнила ленты с тем же значением (BACKFILL).
+FEED_BACKFILL = 50
+
+SHOPPING_LIST_PDF_DIR = os.getenv('SHOPPING_LIST_PDF_DIR',
+                                  BASE_DIR / 'data' / 'shopping_lists')
+# Процессов рендера PDF на весь хост; каждый из WEB_CONCURRENCY воркеров
+# gunicorn (он читает ту же переменную) получает свою долю, не меньше одного.
+SHOPPING_LIST_PDF_WORKERS = int(os.getenv('SHOPPING_LIST_PDF_WORKERS', 2))
+WEB_CONCURRENCY = max(1, int(os.getenv('WEB_CONCURRENCY', 1)))
+SHOPPING_LIST_PDF_TIMEOUT = 5 * 60
+SHOPPING_LIST_PDF_TTL = 24 * 60 * 60
+
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
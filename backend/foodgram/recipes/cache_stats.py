@@ -0,0 +1,63 @@
+"""Счётчики попаданий в кэши.
+
+Процесс считает обращения у себя и раз в STATS_FLUSH обращений
+прибавляет накопленное к строкам CacheCounter. Суммы по всем процессам
+лежат в БД и поэтому видны при любом CACHE_BACKEND, в том числе
+при LocMem, где у каждого процесса свой кэш.
+"""
+import threading
+from collections import Counter
+
+from django.db.models import F
+
+from recipes.models import CacheCounter
+
+STATS_FLUSH = 100
+
+
+class HitCounter:
+    """Счётчики с общим префиксом: накапливаются в процессе, пишутся в БД."""
+
+    def __init__(self, prefix, names, flush=STATS_FLUSH):
+        self.prefix = prefix
+        self.names = names
+        self.flush_every = flush
+        self.pending = Counter()
+        self.lock = threading.Lock()
+
+    def key(self, name):
+        return f'{self.prefix}:{name}'
+
+    def count(self, name, value=1):
+        if not value:
+            return
+        with self.lock:
+            self.pending[name] += value
+            if sum(self.pending.values()) < self.flush_every:
+                return
+        self.flush()
+
+    def flush(self):
+        with self.lock:
+            flushed = {self.key(name): value
+                       for name, value in self.pending.items()}
+            self.pending.clear()
+        if not flushed:
+            return
+        # Строки создаются заранее: прибавление к ним через F() не теряет
+        # значения, записанные другими процессами в то же время.
+        CacheCounter.objects.bulk_create(
+            [CacheCounter(name=key) for key in flushed],
+            ignore_conflicts=True)
+        for key, value in flushed.items():
+            CacheCounter.objects.filter(name=key).update(
+                value=F('value') + value)
+
+    def totals(self):
+        """Суммы из БД вместе с ещё не записанными обращениями процесса."""
+        stored = dict(CacheCounter.objects.filter(
+            name__in=[self.key(name) for name in self.names]).values_list(
+            'name', 'value'))
+        with self.lock:
+            return {name: stored.get(self.key(name), 0) + self.pending[name]
+                    for name in self.names}
@@ -0,0 +1,58 @@
+"""Условные GET-запросы (ETag) по версиям таблиц.
+
+Last-Modified не отдаётся: его точность — секунда, и две записи
+в пределах одной секунды дали бы клиенту ошибочный 304.
+"""
+import hashlib
+
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+from recipes.models import TableVersion
+
+
+def bump_version(*names):
+    """Увеличивает версии таблиц после записи в них."""
+    now = timezone.now()
+    updated = TableVersion.objects.filter(name__in=names).update(
+        version=F('version') + 1, updated_at=now)
+    if updated < len(set(names)):
+        TableVersion.objects.bulk_create(
+            [TableVersion(name=name, version=1, updated_at=now)
+             for name in set(names)],
+            ignore_conflicts=True)
+
+
+class ConditionalGetMixin:
+    """Отдаёт 304, если версии таблиц представления не изменились."""
+    version_tables = ()
+    per_user = False
+
+    def get_etag(self, request):
+        versions = dict.fromkeys(self.version_tables, 0)
+        versions.update(TableVersion.objects.filter(
+            name__in=self.version_tables).values_list('name', 'version'))
+        key = [f'{name}:{versions[name]}' for name in sorted(versions)]
+        key.append(request.accepted_media_type or '')
+        if self.per_user:
+            key.append(str(request.user.pk))
+        return quote_etag(hashlib.md5(';'.join(key).encode()).hexdigest())
+
+    def conditional_get(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_get(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_get(super().retrieve, request,
+                                    *args, **kwargs)
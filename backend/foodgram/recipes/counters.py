@@ -0,0 +1,58 @@
+"""Денормализованные счётчики избранного, покупок, рецептов и подписчиков."""
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from recipes.models import Recipe, UserRecipeLists
+from user.models import UserSubscription
+
+User = get_user_model()
+
+USER_LIST_COUNTERS = {
+    'is_favorited': 'favorites_count',
+    'is_in_shopping_cart': 'shopping_cart_count',
+}
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно меняет счётчик, не опуская его ниже нуля."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def count_subquery(queryset, field):
+    return Coalesce(Subquery(
+        queryset.order_by().values(field)
+        .annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()), 0)
+
+
+def reconcile_counters():
+    """Пересчитывает счётчики и возвращает число исправленных строк."""
+    fixed = 0
+    recipe_counters = {
+        counter: count_subquery(
+            UserRecipeLists.objects.filter(recipe=OuterRef('pk'),
+                                           **{flag: True}), 'recipe')
+        for flag, counter in USER_LIST_COUNTERS.items()}
+    user_counters = {
+        'recipes_count': count_subquery(
+            Recipe.objects.filter(author=OuterRef('pk')), 'author'),
+        'subscribers_count': count_subquery(
+            UserSubscription.objects.filter(sub_id=OuterRef('pk')),
+            'sub_id'),
+    }
+    for model, counters in ((Recipe, recipe_counters),
+                            (User, user_counters)):
+        drift = Q()
+        for counter in counters:
+            drift |= ~Q(**{counter: F(f'actual_{counter}')})
+        queryset = model.objects.annotate(**{
+            f'actual_{counter}': expression
+            for counter, expression in counters.items()}).filter(drift)
+        for pk in queryset.values_list('pk', flat=True):
+            model.objects.filter(pk=pk).update(**counters)
+            fixed += 1
+    return fixed
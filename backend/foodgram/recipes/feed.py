@@ -0,0 +1,60 @@
+"""Лента рецептов авторов, на которых подписан пользователь.
+
+Лента хранится готовой: новый рецепт сразу раскладывается в таблицу
+FeedItem всем подписчикам автора, подписка подтягивает последние
+рецепты автора, отписка их убирает. Рецепты авторов, у которых больше
+FEED_FANOUT_LIMIT подписчиков, не раскладываются при записи: читатель
+забирает их в свою ленту сам при открытии первой страницы. Так чтение
+ленты всегда идёт по индексу (user, recipe) одной таблицы.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+
+from recipes.models import FeedItem, Recipe
+from user.models import UserSubscription
+
+FANOUT_BATCH = 1000
+
+User = get_user_model()
+
+
+def fan_out(recipes):
+    """Добавляет новые рецепты в ленты подписчиков их авторов."""
+    recipe_ids = defaultdict(list)
+    for recipe in recipes:
+        recipe_ids[recipe.author_id].append(recipe.id)
+    followers = UserSubscription.objects.filter(
+        sub_id__in=recipe_ids,
+        sub_id__subscribers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).order_by().values_list('person_id', 'sub_id')
+    FeedItem.objects.bulk_create(
+        (FeedItem(user_id=user_id, author_id=author_id, recipe_id=recipe_id)
+         for user_id, author_id in followers.iterator()
+         for recipe_id in recipe_ids[author_id]),
+        batch_size=FANOUT_BATCH, ignore_conflicts=True)
+
+
+def backfill(user_id, author_id):
+    """Кладёт в ленту последние FEED_BACKFILL рецептов автора."""
+    recipes = Recipe.objects.filter(author=author_id).order_by(
+        '-id').values_list('id', flat=True)[:settings.FEED_BACKFILL]
+    FeedItem.objects.bulk_create(
+        [FeedItem(user_id=user_id, author_id=author_id, recipe_id=recipe_id)
+         for recipe_id in recipes],
+        ignore_conflicts=True)
+
+
+def prune(user_id, author_id):
+    FeedItem.objects.filter(user=user_id, author=author_id).delete()
+
+
+def pull(user):
+    """Забирает в ленту свежие рецепты авторов без раскладки."""
+    authors = User.objects.filter(
+        user_subscription__person_id=user,
+        subscribers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values_list('id', flat=True)
+    for author_id in authors:
+        backfill(user.id, author_id)
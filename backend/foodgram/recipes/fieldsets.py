@@ -0,0 +1,50 @@
+"""Выборочные поля ответа: ``?fields=name,image`` и ``?omit=text``.
+
+Параметры действуют только на корневой сериализатор GET-запроса;
+представления по тем же параметрам убирают из запроса ненужные
+столбцы, prefetch и аннотации.
+"""
+from collections import OrderedDict
+
+from rest_framework.serializers import ListSerializer
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+
+def _names(value):
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+def requested_fields(request, fields):
+    """Имена из fields, оставшиеся после ?fields= и ?omit=."""
+    if request is None or request.method != 'GET':
+        return tuple(fields)
+    only = request.query_params.get(FIELDS_PARAM)
+    omit = _names(request.query_params.get(OMIT_PARAM, ''))
+    if only:
+        only = _names(only)
+    return tuple(name for name in fields
+                 if (not only or name in only) and name not in omit)
+
+
+def model_fields(serializer_fields, sources):
+    """Столбцы модели, нужные выбранным полям сериализатора."""
+    return {column for name in serializer_fields
+            for column in sources.get(name, ())}
+
+
+class SparseFieldsetMixin:
+    """Оставляет в корневом сериализаторе только запрошенные поля."""
+
+    def is_root_serializer(self):
+        return self.parent is None or (
+            isinstance(self.parent, ListSerializer)
+            and self.parent.parent is None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        if not self.is_root_serializer():
+            return fields
+        selected = requested_fields(self.context.get('request'), fields)
+        return OrderedDict((name, fields[name]) for name in selected)
@@ -0,0 +1,67 @@
+"""Общий для всех пользователей кэш сериализованных рецептов.
+
+Фрагмент хранится под ключом из id рецепта и его версии (Recipe.version).
+Версию увеличивают сигналы при записи в рецепт, его теги, ингредиенты
+и публичные поля автора. Она лежит в строке рецепта, поэтому запись
+в любом процессе сразу меняет ключ во всех остальных, даже если у каждого
+процесса свой кэш: старый фрагмент просто перестаёт читаться и со
+временем вытесняется. Изменения других рецептов ключ не трогают.
+"""
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import F
+
+from recipes.cache_stats import HitCounter
+from recipes.models import Recipe
+
+# Меняется вместе с набором полей RecipeListSerializer.
+FRAGMENT_FORMAT = 4
+# Поля автора, которые входят во фрагмент рецепта.
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name', 'avatar')
+
+stats = HitCounter('recipe-fragment', ('hits', 'misses'))
+
+
+def is_shared_cache(alias=DEFAULT_CACHE_ALIAS):
+    """Видят ли кэш все процессы сервера, а не только текущий."""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def touch(recipes):
+    """Увеличивает версии рецептов из queryset, а с ними ключи фрагментов."""
+    recipes.update(version=F('version') + 1)
+
+
+def touch_recipe(recipe):
+    """То же для одного рецепта; экземпляр получает новую версию."""
+    recipes = Recipe.objects.filter(pk=recipe.pk)
+    touch(recipes)
+    recipe.version = recipes.values_list('version', flat=True).first()
+
+
+def fragment_key(recipe):
+    return f'recipe-fragment:v{FRAGMENT_FORMAT}:{recipe.id}:{recipe.version}'
+
+
+def get_fragments(recipes):
+    """Возвращает ключи фрагментов и найденные в кэше фрагменты."""
+    keys = {recipe.id: fragment_key(recipe) for recipe in recipes}
+    found = cache.get_many(keys.values())
+    fragments = {recipe_id: found[key] for recipe_id, key in keys.items()
+                 if key in found}
+    stats.count('hits', len(fragments))
+    stats.count('misses', len(keys) - len(fragments))
+    return keys, fragments
+
+
+def set_fragments(fragments):
+    cache.set_many(fragments, settings.RECIPE_FRAGMENT_TIMEOUT)
+
+
+def hit_rate():
+    totals = stats.totals()
+    hits, misses = totals['hits'], totals['misses']
+    total = hits + misses
+    return hits, misses, hits / total if total else 0
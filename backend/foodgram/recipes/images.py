@@ -0,0 +1,226 @@
+"""Производные изображений рецептов и аватаров.
+
+При загрузке из оригинала без перекодирования вырезаются EXIF и XMP
+(кроме ориентации снимка), а после сохранения модели рядом с ним
+в каталоге ``variants/`` создаются уменьшенные копии фиксированного
+размера в JPEG и WebP. Имена копий вычисляются из имени оригинала, поэтому
+сериализаторам не нужны запросы к БД. Копии появляются только после
+коммита, так что до тех пор вместо них отдаётся адрес оригинала;
+после их создания версия таблицы меняется и кэшированные ответы
+обновляются.
+"""
+import logging
+import posixpath
+import struct
+import zlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, JpegImagePlugin
+
+RECIPE_VARIANTS = {'card': (480, 320), 'thumbnail': (160, 160)}
+AVATAR_VARIANTS = {'avatar': (96, 96)}
+FORMATS = {'jpeg': 'jpg', 'webp': 'webp'}
+QUALITY = 80
+ORIENTATION = 0x0112
+# APP13 (IPTC) и комментарии; APP1 с EXIF и XMP разбирается отдельно.
+JPEG_METADATA = (0xED, 0xFE)
+XMP_PREFIXES = (b'http://ns.adobe.com/xap/1.0/\0',
+                b'http://ns.adobe.com/xmp/extension/\0')
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+PNG_METADATA = (b'eXIf', b'tEXt', b'zTXt', b'iTXt', b'tIME')
+WEBP_EXIF, WEBP_XMP = 0x08, 0x04
+
+logger = logging.getLogger(__name__)
+
+
+def strip_metadata(file):
+    """Возвращает копию загруженного изображения без EXIF и XMP.
+
+    Пиксели не перекодируются: из файла вырезаются блоки метаданных,
+    а профиль ICC и таблицы квантования остаются как были. Из EXIF
+    сохраняется только ориентация снимка.
+    """
+    file.seek(0)
+    with Image.open(file) as image:
+        strip = STRIPPERS.get(image.format)
+        if strip is None:
+            file.seek(0)
+            return file
+        orientation = image.getexif().get(ORIENTATION, 1)
+        file.seek(0)
+        data = file.read()
+        try:
+            data = strip(data, orientation_exif(orientation))
+        except (ValueError, IndexError, struct.error):
+            data = reencode(image)
+    return ContentFile(data, name=file.name)
+
+
+def orientation_exif(orientation):
+    """EXIF из одного тега ориентации; пустой, если она обычная."""
+    if orientation == 1:
+        return b''
+    exif = Image.Exif()
+    exif[ORIENTATION] = orientation
+    return exif.tobytes()
+
+
+def strip_jpeg(data, exif):
+    if data[:2] != b'\xff\xd8':
+        raise ValueError('Нет маркера SOI')
+    parts, position = [data[:2]], 2
+    while True:
+        if data[position] != 0xFF:
+            raise ValueError('Нет маркера сегмента')
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # Заполняющие байты между сегментами.
+            position += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD7:
+            parts.append(data[position:position + 2])
+            position += 2
+            continue
+        if marker == 0xDA:
+            # Со SOS начинаются сжатые данные: они копируются как есть.
+            parts.append(data[position:])
+            return b''.join(parts)
+        length, = struct.unpack('>H', data[position + 2:position + 4])
+        end = position + 2 + length
+        if end > len(data):
+            raise ValueError('Сегмент за концом файла')
+        payload = data[position + 4:end]
+        if marker == 0xE1 and payload.startswith(b'Exif\0\0'):
+            if exif:
+                parts.append(b'\xff\xe1' + struct.pack('>H', len(exif) + 2)
+                             + exif)
+                exif = b''
+        elif marker not in JPEG_METADATA and not (
+                marker == 0xE1 and payload.startswith(XMP_PREFIXES)):
+            parts.append(data[position:end])
+        position = end
+
+
+def png_chunk(kind, payload):
+    return (struct.pack('>I', len(payload)) + kind + payload
+            + struct.pack('>I', zlib.crc32(kind + payload)))
+
+
+def strip_png(data, exif):
+    if data[:8] != PNG_SIGNATURE:
+        raise ValueError('Нет сигнатуры PNG')
+    parts, position = [data[:8]], 8
+    while position < len(data):
+        length, = struct.unpack('>I', data[position:position + 4])
+        kind = data[position + 4:position + 8]
+        end = position + 12 + length
+        if end > len(data):
+            raise ValueError('Блок за концом файла')
+        if kind in (b'IDAT', b'IEND') and exif:
+            parts.append(png_chunk(b'eXIf', exif[6:]))
+            exif = b''
+        if kind not in PNG_METADATA:
+            parts.append(data[position:end])
+        position = end
+    return b''.join(parts)
+
+
+def strip_webp(data, exif):
+    if data[:4] != b'RIFF' or data[8:12] != b'WEBP':
+        raise ValueError('Нет заголовка WebP')
+    chunks, position = [], 12
+    while position < len(data):
+        kind = data[position:position + 4]
+        length, = struct.unpack('<I', data[position + 4:position + 8])
+        end = position + 8 + length + length % 2
+        if end > len(data):
+            raise ValueError('Блок за концом файла')
+        if kind not in (b'EXIF', b'XMP '):
+            chunks.append([kind, data[position + 8:position + 8 + length]])
+        position = end
+    if chunks[0][0] == b'VP8X':
+        flags = chunks[0][1][0] & ~(WEBP_EXIF | WEBP_XMP)
+        if exif:
+            flags |= WEBP_EXIF
+            chunks.append([b'EXIF', exif[6:]])
+        chunks[0][1] = bytes([flags]) + chunks[0][1][1:]
+    body = b''.join(
+        kind + struct.pack('<I', len(payload)) + payload
+        + b'\0' * (len(payload) % 2) for kind, payload in chunks)
+    return b'RIFF' + struct.pack('<I', len(body) + 4) + b'WEBP' + body
+
+
+def reencode(image):
+    """Запасной путь для файла, структуру которого не удалось разобрать."""
+    options = {'icc_profile': image.info.get('icc_profile')}
+    if image.format == 'JPEG':
+        options['qtables'] = image.quantization
+        sampling = JpegImagePlugin.get_sampling(image)
+        if sampling >= 0:
+            options['subsampling'] = sampling
+    image_format = image.format
+    cleaned = ImageOps.exif_transpose(image)
+    cleaned.info.pop('exif', None)
+    buffer = BytesIO()
+    cleaned.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+STRIPPERS = {'JPEG': strip_jpeg, 'PNG': strip_png, 'WEBP': strip_webp}
+
+
+def variant_name(name, variant, image_format):
+    directory, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(directory, 'variants',
+                          f'{stem}_{variant}.{FORMATS[image_format]}')
+
+
+def variant_urls(name, variants):
+    if not name:
+        return None
+    if not has_variants(name, variants):
+        url = default_storage.url(name)
+        return {variant: dict.fromkeys(FORMATS, url) for variant in variants}
+    return {variant: {image_format: default_storage.url(
+        variant_name(name, variant, image_format))
+        for image_format in FORMATS} for variant in variants}
+
+
+def has_variants(name, variants):
+    # WebP каждого размера пишется последним.
+    return all(default_storage.exists(variant_name(name, variant, 'webp'))
+               for variant in variants)
+
+
+def make_variants(name, variants):
+    """Создаёт все размеры и форматы; False, если оригинал не читается."""
+    try:
+        with default_storage.open(name) as file, Image.open(file) as image:
+            image = ImageOps.exif_transpose(image)
+            for variant, size in variants.items():
+                resized = ImageOps.fit(image, size, Image.LANCZOS)
+                for image_format in FORMATS:
+                    save_variant(resized, variant_name(name, variant,
+                                                       image_format),
+                                 image_format)
+    except (OSError, ValueError) as error:
+        logger.warning('Cannot make variants for %s: %s', name, error)
+        return False
+    return True
+
+
+def save_variant(image, name, image_format):
+    if image_format == 'jpeg' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        image = image.convert('RGBA')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = BytesIO()
+    image.save(buffer, image_format.upper(), quality=QUALITY, optimize=True)
+    default_storage.delete(name)
+    default_storage.save(name, ContentFile(buffer.getvalue()))
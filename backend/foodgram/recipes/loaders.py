@@ -0,0 +1,199 @@
+"""Потоковая загрузка справочника ингредиентов.
+
+Источник читается построчно (CSV) или по одному объекту (JSON-массив
+или NDJSON), так что память не зависит от размера файла. Строки
+добавляются только если пары (название, единица) ещё нет: загрузка
+идемпотентна и никогда не удаляет ингредиенты, на которые ссылаются
+рецепты. Пару охраняет ограничение unique_ingredient, а вставка
+пропускает конфликты, так что параллельные загрузки не создают
+дублей и не падают. На PostgreSQL данные заливаются COPY во временную
+таблицу и переносятся одним INSERT ... SELECT, на остальных СУБД —
+пачками, каждая в своей транзакции.
+"""
+import csv
+import io
+import json
+from pathlib import Path
+
+from django.db import connection, transaction
+
+from recipes.conditional import bump_version
+from recipes.models import Ingredient
+from recipes.search import rebuild_index
+
+BATCH_SIZE = 1000
+DRY_RUN_SAMPLE = 20
+READ_SIZE = 64 * 1024
+NAME_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_LENGTH = Ingredient._meta.get_field('measurement_unit').max_length
+
+
+def iter_json(file):
+    """Объекты из JSON-массива или NDJSON без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in '[], \t\r\n':
+            position += 1
+        if position == len(buffer) and eof:
+            return
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            if eof:
+                raise
+            end = None
+        if end is None or (end == len(buffer) and not eof):
+            chunk = file.read(READ_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield value
+        position = end
+
+
+def read_rows(path):
+    path = Path(path)
+    with open(path, encoding='utf-8') as file:
+        if path.suffix == '.csv':
+            yield from csv.DictReader(file)
+        else:
+            yield from iter_json(file)
+
+
+class LoadResult:
+    def __init__(self):
+        self.read = 0
+        self.skipped = 0
+        self.new = 0
+        self.sample = []
+
+
+def clean_rows(rows, result):
+    """Обрезает пробелы и отбрасывает строки без названия или единицы."""
+    for row in rows:
+        result.read += 1
+        name = str(row.get('name') or '').strip()
+        unit = str(row.get('measurement_unit') or '').strip()
+        if (not name or not unit or len(name) > NAME_LENGTH
+                or len(unit) > UNIT_LENGTH):
+            result.skipped += 1
+            continue
+        yield name, unit
+
+
+def batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def upsert_batched(rows, result, dry_run=False, batch_size=BATCH_SIZE):
+    """Переносимый путь: запрос на пачку плюс bulk_create новых строк."""
+    # В пробном прогоне новые пары не пишутся в БД, поэтому, чтобы
+    # не посчитать повтор дважды, их приходится помнить.
+    planned = set()
+    for batch in batches(rows, batch_size):
+        keys = set(batch)
+        existing = set(Ingredient.objects.filter(
+            name__in={name for name, _ in keys}).values_list(
+                'name', 'measurement_unit'))
+        missing = sorted(keys - existing - planned)
+        result.new += len(missing)
+        if dry_run:
+            planned.update(missing)
+            result.sample.extend(
+                missing[:max(0, DRY_RUN_SAMPLE - len(result.sample))])
+            continue
+        # Пару могла успеть вставить параллельная загрузка.
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in missing),
+                ignore_conflicts=True)
+
+
+class CSVStream(io.RawIOBase):
+    """Файлоподобный поток CSV из пар (название, единица) для COPY."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buffer = b''
+        self.text = io.StringIO()
+        self.writer = csv.writer(self.text)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.buffer += self.text.getvalue().encode()
+            self.text.seek(0)
+            self.text.truncate()
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+STAGING_SQL = '''
+    CREATE TEMPORARY TABLE ingredient_staging (
+        name text, measurement_unit text) ON COMMIT DROP
+'''
+NEW_ROWS_SQL = '''
+    SELECT DISTINCT s.name, s.measurement_unit
+    FROM ingredient_staging s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {table} i
+        WHERE i.name = s.name AND i.measurement_unit = s.measurement_unit)
+'''
+
+
+def upsert_copy(rows, result, dry_run=False):
+    """PostgreSQL: COPY во временную таблицу и один INSERT ... SELECT."""
+    table = connection.ops.quote_name(Ingredient._meta.db_table)
+    new_rows = NEW_ROWS_SQL.format(table=table)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(STAGING_SQL)
+        cursor.copy_expert(
+            'COPY ingredient_staging (name, measurement_unit) '
+            'FROM STDIN WITH (FORMAT csv)', CSVStream(rows))
+        if dry_run:
+            cursor.execute(f'SELECT count(*) FROM ({new_rows}) new')
+            result.new = cursor.fetchone()[0]
+            cursor.execute(f'{new_rows} ORDER BY 1, 2 LIMIT %s',
+                           [DRY_RUN_SAMPLE])
+            result.sample = cursor.fetchall()
+            return
+        cursor.execute(f'INSERT INTO {table} (name, measurement_unit) '
+                       f'{new_rows} '
+                       f'ON CONFLICT (name, measurement_unit) DO NOTHING')
+        result.new = cursor.rowcount
+
+
+def load_ingredients(paths, dry_run=False, batch_size=BATCH_SIZE,
+                     use_copy=True):
+    """Добавляет недостающие ингредиенты из файлов; возвращает итоги."""
+    result = LoadResult()
+    rows = clean_rows((row for path in paths for row in read_rows(path)),
+                      result)
+    if use_copy and connection.vendor == 'postgresql':
+        upsert_copy(rows, result, dry_run)
+    else:
+        upsert_batched(rows, result, dry_run, batch_size)
+    if result.new and not dry_run:
+        bump_version('ingredient')
+        rebuild_index()
+    return result
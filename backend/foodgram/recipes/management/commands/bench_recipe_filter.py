@@ -0,0 +1,138 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.http import QueryDict
+
+from recipes.mixins import recipe_filter
+from recipes.models import Recipe, Tag, TagRecipe, UserRecipeLists
+
+BATCH_SIZE = 5000
+AUTHORS = 100
+TAGS = 5
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Time recipe list filters on synthetic data of the given size; '
+            'all generated rows are rolled back')
+
+    def add_arguments(self, parser):
+        parser.add_argument('recipes', nargs='?', type=int, default=100000)
+        parser.add_argument('--list-rows', type=int, default=1000000,
+                            help='Строк избранного и корзины всего')
+        parser.add_argument('--viewers', type=int, default=1000,
+                            help='Между сколькими пользователями их делить')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--explain', action='store_true',
+                            help='Печатать план каждого запроса')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                viewer, authors, tags = self.seed(options)
+                for name, params in self.cases(viewer, authors, tags):
+                    self.bench(name, params, viewer, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, options):
+        start = time.perf_counter()
+        size, viewers = options['recipes'], options['viewers']
+        User.objects.bulk_create(
+            User(username=f'bench-filter-{number}',
+                 email=f'bench-filter-{number}@example.org')
+            for number in range(AUTHORS + viewers))
+        users = list(User.objects.filter(
+            username__startswith='bench-filter-').order_by('id')
+            .values_list('id', flat=True))
+        authors, viewer_ids = users[:AUTHORS], users[AUTHORS:]
+        tags = [Tag.objects.create(name=f'bench-{number}',
+                                   slug=f'bench-{number}')
+                for number in range(TAGS)]
+        # id задаются явно: bulk_create не везде возвращает их.
+        first = (Recipe.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+        for offset in range(0, size, BATCH_SIZE):
+            ids = range(first + offset, first + min(offset + BATCH_SIZE,
+                                                    size))
+            Recipe.objects.bulk_create(
+                Recipe(id=pk, name=f'Рецепт {pk}', text='Текст',
+                       cooking_time=pk % 120 + 1, image='bench.png',
+                       author_id=authors[pk % len(authors)])
+                for pk in ids)
+            TagRecipe.objects.bulk_create(
+                TagRecipe(recipe_id=pk, tag=tags[(pk + shift) % TAGS])
+                for pk in ids for shift in range(pk % 2 + 1))
+        rows = self.seed_lists(first, size, viewer_ids,
+                               options['list_rows'])
+        self.stdout.write(f'Seeded {size} recipes and {rows} list rows for '
+                          f'{len(viewer_ids)} users in '
+                          f'{time.perf_counter() - start:.1f} s')
+        return User.objects.get(pk=viewer_ids[0]), authors, tags
+
+    def seed_lists(self, first, size, viewer_ids, total):
+        """Раскладывает total строк поровну между пользователями.
+
+        У каждого пользователя рецепты идут с шагом size // per_user
+        и своим сдвигом, так что пары (user, recipe) не повторяются.
+        """
+        per_user = min(size, total // len(viewer_ids))
+        step = size // per_user if per_user else 1
+        rows, batch = 0, []
+        for number, user_id in enumerate(viewer_ids):
+            for index in range(per_user):
+                pk = first + (index * step + number % step) % size
+                batch.append(UserRecipeLists(
+                    recipe_id=pk, user_id=user_id,
+                    is_favorited=index % 2 == 0,
+                    is_in_shopping_cart=index % 3 != 1))
+                if len(batch) == BATCH_SIZE:
+                    UserRecipeLists.objects.bulk_create(batch)
+                    rows += len(batch)
+                    batch = []
+        UserRecipeLists.objects.bulk_create(batch)
+        return rows + len(batch)
+
+    def cases(self, viewer, authors, tags):
+        # Авторы рецептов, которые у зрителя в избранном и не в корзине,
+        # чтобы сочетание всех фильтров не было пустым.
+        listed = list(UserRecipeLists.objects.filter(
+            user=viewer, is_favorited=True, is_in_shopping_cart=False)
+            .order_by().values_list('recipe__author', flat=True)
+            .distinct()[:2]) or authors[:2]
+        return (
+            ('no filters', ''),
+            ('author', f'author={authors[0]}'),
+            ('one tag', f'tags={tags[0].slug}'),
+            ('two tags', f'tags={tags[0].slug}&tags={tags[1].slug}'),
+            ('favorited', 'is_favorited=1'),
+            ('not in cart', 'is_in_shopping_cart=0'),
+            ('all', f'author={listed[0]}&author={listed[-1]}'
+                    f'&tags={tags[0].slug}&is_favorited=1'
+                    f'&is_in_shopping_cart=0'),
+        )
+
+    def bench(self, name, params, viewer, options):
+        queryset = Recipe.objects.filter(
+            *recipe_filter(QueryDict(params), viewer)).order_by('name', 'id')
+        timings = []
+        for _ in range(options['repeat']):
+            start = time.perf_counter()
+            total = queryset.count()
+            list(queryset.values_list('id', flat=True)[:6])
+            timings.append(time.perf_counter() - start)
+        self.stdout.write(
+            f'{name}: {total} rows, median '
+            f'{statistics.median(timings) * 1000:.1f} ms '
+            f'(count + first page)')
+        if options['explain']:
+            self.stdout.write(queryset[:6].explain())
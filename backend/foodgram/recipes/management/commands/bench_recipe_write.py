@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.serializers import RecipeSerializer
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Count queries of recipe create and update through '
+            'RecipeSerializer; all changes are rolled back')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients', type=int, default=30)
+
+    def handle(self, *args, **options):
+        size = options['ingredients']
+        ingredients = list(Ingredient.objects.values_list('id', flat=True)
+                           [:size + size // 3])
+        tags = list(Tag.objects.values_list('id', flat=True)[:3])
+        if len(ingredients) < size or not tags:
+            raise CommandError(f'Нужно {size + size // 3} ингредиентов '
+                               f'и хотя бы один тег')
+        try:
+            with transaction.atomic():
+                self.bench(ingredients, tags, size)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def bench(self, ingredients, tags, size):
+        user = User.objects.create(username='bench-recipe-write',
+                                   email='bench-recipe-write@example.org')
+        request = APIRequestFactory().post('/api/recipes/')
+        request.user = user
+        data = {
+            'name': 'Бенчмарк', 'text': 'Текст', 'cooking_time': 10,
+            'tags': tags,
+            'ingredients': [{'id': pk, 'amount': 1}
+                            for pk in ingredients[:size]],
+        }
+        recipe = self.measure('create', request, data)
+        self.measure('update, unchanged', request, data, recipe)
+        changed = {
+            **data,
+            'tags': tags[:1],
+            'ingredients': (
+                [{'id': pk, 'amount': 2} for pk in ingredients[:size // 3]]
+                + [{'id': pk, 'amount': 1}
+                   for pk in ingredients[size // 3:size * 2 // 3]]
+                + [{'id': pk, 'amount': 1}
+                   for pk in ingredients[size:]]),
+        }
+        self.measure('update, a third changed, removed and added',
+                     request, changed, recipe)
+
+    def measure(self, name, request, data, instance=None):
+        serializer = RecipeSerializer(instance, data=data,
+                                      context={'request': request})
+        with CaptureQueriesContext(connection) as queries:
+            serializer.is_valid(raise_exception=True)
+            recipe = serializer.save()
+        self.stdout.write(f'{name}: {len(queries)} queries')
+        return Recipe.objects.get(pk=recipe.pk)
@@ -0,0 +1,54 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Ingredient
+from recipes.pdf import ShoppingListPDF, register_font
+from recipes.shopping_list import (shopping_list_csv, shopping_list_json,
+                                   shopping_list_text)
+
+FORMATS = {
+    'pdf': ShoppingListPDF,
+    'json': shopping_list_json,
+    'txt': shopping_list_text,
+    'csv': shopping_list_csv,
+}
+
+
+class Command(BaseCommand):
+    help = 'Benchmark shopping list rendering for carts of given sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('sizes', nargs='*', type=int,
+                            default=[10, 1000, 10000])
+        parser.add_argument('--format', action='append', choices=FORMATS,
+                            dest='formats',
+                            help='Формат для замера, по умолчанию все')
+
+    def handle(self, *args, **options):
+        catalog = list(Ingredient.objects.values('name', 'measurement_unit')
+                       ) or [{'name': 'ингредиент', 'measurement_unit': 'г'}]
+        self.stdout.write(f'Font load: {register_font() * 1000:.0f} ms')
+        for size in options['sizes']:
+            for name in options['formats'] or FORMATS:
+                self.bench(catalog, size, name)
+
+    def bench(self, catalog, size, name):
+        rows = ({**catalog[number % len(catalog)], 'amount': number}
+                for number in range(size))
+        tracemalloc.start()
+        start = time.perf_counter()
+        document = FORMATS[name](rows)
+        total = sum(len(chunk) for chunk in document)
+        duration = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        pages = ''
+        if isinstance(document, ShoppingListPDF):
+            pages = f'{len(document.pages)} pages, '
+        self.stdout.write(
+            f'{size} ingredients, {name}: {duration * 1000:.0f} ms, '
+            f'{pages}{total // 1024} KB, '
+            f'{size / max(duration, 1e-9):.0f} rows/s, '
+            f'peak memory {peak // 1024} KB')
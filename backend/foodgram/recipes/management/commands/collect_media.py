@@ -0,0 +1,58 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.storage import content_fields, content_storage, reference_counts
+
+
+class Command(BaseCommand):
+    help = 'Delete content-addressed media blobs no row refers to'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=60 * 60,
+                            help='Не трогать блобы моложе N секунд')
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        counts = reference_counts()
+        deadline = timezone.now() - timedelta(seconds=options['grace'])
+        blobs = deleted = 0
+        for directory in {field.upload_to.rstrip('/')
+                          for field in content_fields()}:
+            for name in self.blobs(directory):
+                blobs += 1
+                if (name in counts or content_storage.get_modified_time(
+                        name) > deadline):
+                    continue
+                deleted += 1
+                if options['dry_run']:
+                    self.stdout.write(f'Would delete {name}')
+                    continue
+                content_storage.delete(name)
+                for variant in self.variants(name):
+                    content_storage.delete(variant)
+        shared = sum(1 for count in counts.values() if count > 1)
+        self.stdout.write(
+            f'{blobs} blobs, {len(counts)} referenced '
+            f'({shared} shared), {deleted} orphans deleted')
+
+    def blobs(self, directory):
+        if not content_storage.exists(directory):
+            return
+        for prefix in content_storage.listdir(directory)[0]:
+            if len(prefix) != 2:
+                continue
+            path = posixpath.join(directory, prefix)
+            for filename in content_storage.listdir(path)[1]:
+                yield posixpath.join(path, filename)
+
+    def variants(self, name):
+        directory = posixpath.join(posixpath.dirname(name), 'variants')
+        if not content_storage.exists(directory):
+            return []
+        stem = posixpath.splitext(posixpath.basename(name))[0]
+        return [posixpath.join(directory, filename)
+                for filename in content_storage.listdir(directory)[1]
+                if filename.startswith(stem + '_')]
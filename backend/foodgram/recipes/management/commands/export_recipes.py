@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import EXPORT_CHUNK, export_recipes
+
+
+class Command(BaseCommand):
+    help = 'Stream all recipes as NDJSON to a file or stdout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='Файл для записи, "-" — stdout')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        output = (sys.stdout.buffer if path == '-'
+                  else open(path, 'wb'))
+        exported = 0
+        try:
+            for line in export_recipes(options['chunk_size']):
+                output.write(line)
+                exported += 1
+                if exported % options['chunk_size'] == 0:
+                    self.stderr.write(f'Exported {exported} recipes')
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
+        self.stderr.write(f'Exported {exported} recipes')
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from recipes.conditional import bump_version
+from recipes.fragments import touch
+from recipes.images import (AVATAR_VARIANTS, RECIPE_VARIANTS, has_variants,
+                            make_variants)
+from recipes.models import Recipe
+from user.models import User
+
+
+class Command(BaseCommand):
+    help = 'Create missing image variants for recipes and avatars'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать все производные')
+
+    def handle(self, *args, **options):
+        sources = (
+            (Recipe.objects.exclude(image='').values_list('image', flat=True),
+             RECIPE_VARIANTS, 'recipe', 'image'),
+            (User.objects.exclude(avatar='').exclude(avatar=None)
+             .values_list('avatar', flat=True), AVATAR_VARIANTS, 'user',
+             'author__avatar'),
+        )
+        made = 0
+        for names, variants, table, lookup in sources:
+            table_made = 0
+            for name in names.iterator():
+                if options['force'] or not has_variants(name, variants):
+                    if make_variants(name, variants):
+                        touch(Recipe.objects.filter(**{lookup: name}))
+                        table_made += 1
+            # Ответы с адресами оригиналов вместо копий устарели.
+            if table_made:
+                bump_version(table)
+            made += table_made
+        self.stdout.write(f'Variants made for {made} images')
@@ -0,0 +1,36 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import IMPORT_CHUNK, import_recipes
+
+
+class Command(BaseCommand):
+    help = 'Import recipes from an NDJSON file written by export_recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл NDJSON, "-" — stdin')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        # Строки читаются байтами: ошибку кодировки import_recipes
+        # запишет в отчёт как ошибку строки.
+        source = (sys.stdin.buffer if path == '-' else open(path, 'rb'))
+        try:
+            report = import_recipes(source, options['chunk_size'],
+                                    progress=self.progress)
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+        for error in report.errors:
+            self.stderr.write(f'Line {error["line"]}: {error["errors"]}')
+        if report.failed > len(report.errors):
+            self.stderr.write(f'... and {report.failed - len(report.errors)}'
+                              f' more errors')
+        self.stdout.write(f'Done: {report.created} created, '
+                          f'{report.failed} failed')
+
+    def progress(self, report):
+        self.stdout.write(f'{report.lines} lines read, '
+                          f'{report.created} created, {report.failed} failed')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from recipes.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Build ingredient search index file'
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        self.stdout.write(f'Indexed {count} ingredients')
@@ -1,25 +1,40 @@
-import csv
+import time
 from pathlib import Path
 
 from django.core.management.base import BaseCommand
-from recipes.models import Ingredient
+from recipes.loaders import BATCH_SIZE, load_ingredients
 
 from foodgram import settings
 
-DATA_DICT = {
-    'ingredients.csv': Ingredient,
-}
-
 
 class Command(BaseCommand):
-    help = 'Insert csv into data model'
+    help = ('Add missing ingredients from CSV, JSON or NDJSON files; '
+            'existing ingredients are never deleted')
 
-    def handle(self, *args, **options):
-        dir = Path(f'{settings.BASE_DIR}/data')
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            default=[Path(settings.BASE_DIR, 'data', 'ingredients.csv')],
+            help='Файлы с полями name и measurement_unit')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет добавлено')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Не использовать COPY на PostgreSQL')
 
-        for file in DATA_DICT:
-            with open(Path(dir, file), 'r', encoding="utf8") as f:
-                dict_file = csv.DictReader(f)
-                foodgram_data = [DATA_DICT[file](**row) for row in dict_file]
-                DATA_DICT[file].objects.all().delete()
-                DATA_DICT[file].objects.bulk_create(foodgram_data)
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        result = load_ingredients(options['paths'], options['dry_run'],
+                                  options['batch_size'],
+                                  not options['no_copy'])
+        duration = time.perf_counter() - start
+        if options['dry_run']:
+            for name, unit in result.sample:
+                self.stdout.write(f'+ {name} ({unit})')
+            if result.new > len(result.sample):
+                self.stdout.write(f'... and {result.new - len(result.sample)}'
+                                  f' more')
+        verb = 'would be added' if options['dry_run'] else 'added'
+        self.stdout.write(
+            f'{result.read} rows read, {result.skipped} skipped, '
+            f'{result.new} {verb} in {duration:.2f} s')
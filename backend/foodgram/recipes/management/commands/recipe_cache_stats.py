@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from recipes.fragments import hit_rate
+
+
+class Command(BaseCommand):
+    help = 'Show recipe fragment cache hit rate'
+
+    def handle(self, *args, **options):
+        hits, misses, rate = hit_rate()
+        self.stdout.write(f'Hits: {hits}, misses: {misses}, '
+                          f'hit rate: {rate:.1%}')
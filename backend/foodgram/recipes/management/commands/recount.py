@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import reconcile_counters
+from recipes.shopping_list import rebuild_shopping_lists
+
+
+class Command(BaseCommand):
+    help = ('Reconcile favorite, cart, recipe and subscriber counters '
+            'and rebuild shopping lists')
+
+    def handle(self, *args, **options):
+        fixed = reconcile_counters()
+        self.stdout.write(f'Fixed {fixed} rows')
+        rebuilt = rebuild_shopping_lists()
+        self.stdout.write(f'Rebuilt {rebuilt} shopping lists')
@@ -0,0 +1,59 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+MAX_AMOUNT = 32000
+
+
+def duplicates(model, *fields, **filters):
+    return (model.objects.filter(**filters)
+            .order_by()
+            .values(*fields)
+            .annotate(keep_id=Min('id'), total=Count('id'))
+            .filter(total__gt=1))
+
+
+def remove_duplicates(apps, schema_editor):
+    Tag = apps.get_model('recipes', 'Tag')
+    TagRecipe = apps.get_model('recipes', 'TagRecipe')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    UserRecipeLists = apps.get_model('recipes', 'UserRecipeLists')
+
+    for row in duplicates(Tag, 'slug'):
+        extra = Tag.objects.filter(slug=row['slug']).exclude(
+            id=row['keep_id'])
+        TagRecipe.objects.filter(tag__in=extra).update(tag=row['keep_id'])
+        extra.delete()
+
+    for row in duplicates(TagRecipe, 'recipe', 'tag'):
+        (TagRecipe.objects.filter(recipe=row['recipe'], tag=row['tag'])
+         .exclude(id=row['keep_id']).delete())
+
+    for row in duplicates(IngredientRecipe, 'recipe', 'ingredient'):
+        rows = IngredientRecipe.objects.filter(
+            recipe=row['recipe'], ingredient=row['ingredient'])
+        amount = sum(rows.values_list('amount', flat=True))
+        rows.filter(id=row['keep_id']).update(
+            amount=min(amount, MAX_AMOUNT))
+        rows.exclude(id=row['keep_id']).delete()
+
+    for field in ('is_favorited', 'is_in_shopping_cart'):
+        for row in duplicates(UserRecipeLists, 'user', 'recipe',
+                              **{field: True}):
+            extra = (UserRecipeLists.objects
+                     .filter(user=row['user'], recipe=row['recipe'],
+                             **{field: True})
+                     .exclude(id=row['keep_id']))
+            extra.update(**{field: False})
+        UserRecipeLists.objects.filter(is_favorited=False,
+                                       is_in_shopping_cart=False).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0015_auto_20240916_2004'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+    ]
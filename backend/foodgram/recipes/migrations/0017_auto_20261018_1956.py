@@ -0,0 +1,34 @@
+# Generated by Django 3.2 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0016_remove_duplicates'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tag',
+            name='slug',
+            field=models.SlugField(max_length=32, unique=True, verbose_name='Уникальный слаг'),
+        ),
+        migrations.AddConstraint(
+            model_name='ingredientrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='tagrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'tag'), name='unique_recipe_tag'),
+        ),
+        migrations.AddConstraint(
+            model_name='userrecipelists',
+            constraint=models.UniqueConstraint(condition=models.Q(is_favorited=True), fields=('user', 'recipe'), name='unique_user_favorite'),
+        ),
+        migrations.AddConstraint(
+            model_name='userrecipelists',
+            constraint=models.UniqueConstraint(condition=models.Q(is_in_shopping_cart=True), fields=('user', 'recipe'), name='unique_user_shopping_cart'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_subquery(queryset, field):
+    return Coalesce(Subquery(
+        queryset.order_by().values(field)
+        .annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()), 0)
+
+
+def fill_counters(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    UserRecipeLists = apps.get_model('recipes', 'UserRecipeLists')
+    User = apps.get_model('user', 'User')
+    UserSubscription = apps.get_model('user', 'UserSubscription')
+    Recipe.objects.update(
+        favorites_count=count_subquery(UserRecipeLists.objects.filter(
+            recipe=OuterRef('pk'), is_favorited=True), 'recipe'),
+        shopping_cart_count=count_subquery(UserRecipeLists.objects.filter(
+            recipe=OuterRef('pk'), is_in_shopping_cart=True), 'recipe'))
+    User.objects.update(
+        recipes_count=count_subquery(
+            Recipe.objects.filter(author=OuterRef('pk')), 'author'),
+        subscribers_count=count_subquery(
+            UserSubscription.objects.filter(sub_id=OuterRef('pk')),
+            'sub_id'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0020_auto_20261018_2002'),
+        ('user', '0006_auto_20261018_2002'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.2 on 2026-10-18 20:04
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+import django.db.models.deletion
+
+
+def fill_shopping_lists(apps, schema_editor):
+    UserRecipeLists = apps.get_model('recipes', 'UserRecipeLists')
+    ShoppingList = apps.get_model('recipes', 'ShoppingList')
+    rows = (UserRecipeLists.objects
+            .filter(is_in_shopping_cart=True)
+            .order_by()
+            .values('user', 'recipe__recipe_ingredients__ingredient')
+            .annotate(total=Sum('recipe__recipe_ingredients__amount'))
+            .filter(total__gt=0))
+    ShoppingList.objects.bulk_create(
+        (ShoppingList(user_id=row['user'],
+                      ingredient_id=row[
+                          'recipe__recipe_ingredients__ingredient'],
+                      amount=row['total'])
+         for row in rows.iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0021_fill_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingList',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(default=0, verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_lists', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент в списке покупок',
+                'verbose_name_plural': 'Списки покупок',
+                'ordering': ('ingredient',),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglist',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user_shopping_ingredient'),
+        ),
+        migrations.RunPython(fill_shopping_lists,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 3.2 on 2026-10-18 20:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Копия settings.FEED_BACKFILL на момент миграции: миграция не читает
+# настройки, чтобы давать один и тот же результат при любом окружении.
+BACKFILL = 50
+
+
+def fill_feeds(apps, schema_editor):
+    UserSubscription = apps.get_model('user', 'UserSubscription')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FeedItem = apps.get_model('recipes', 'FeedItem')
+    subscriptions = UserSubscription.objects.order_by().values_list(
+        'person_id', 'sub_id')
+    for user_id, author_id in subscriptions.iterator():
+        recipes = Recipe.objects.filter(author=author_id).order_by(
+            '-id').values_list('id', flat=True)[:BACKFILL]
+        FeedItem.objects.bulk_create(
+            FeedItem(user_id=user_id, author_id=author_id, recipe_id=pk)
+            for pk in recipes)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0023_alter_recipe_image'),
+        ('user', '0007_alter_user_avatar'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_items', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Ленты подписок',
+                'ordering': ('-recipe',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feeditem',
+            index=models.Index(fields=['user', 'author'], name='feed_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feeditem',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_feed_recipe'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
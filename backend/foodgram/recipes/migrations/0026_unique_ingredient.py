@@ -0,0 +1,64 @@
+# Generated by Django 3.2 on 2026-10-18 21:12
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+MAX_AMOUNT = 32000
+
+
+def merge_rows(model, extra_ids, keep_id, owner, limit=None):
+    """Переносит строки на оставляемый ингредиент, складывая повторы."""
+    owners = set()
+    for row in model.objects.filter(ingredient__in=extra_ids).order_by('id'):
+        owner_id = getattr(row, f'{owner}_id')
+        owners.add(owner_id)
+        kept = model.objects.filter(**{owner: owner_id,
+                                       'ingredient': keep_id}).first()
+        if kept is None:
+            row.ingredient_id = keep_id
+            row.save(update_fields=['ingredient'])
+            continue
+        kept.amount += row.amount
+        if limit is not None:
+            kept.amount = min(kept.amount, limit)
+        kept.save(update_fields=['amount'])
+        row.delete()
+    return owners
+
+
+def remove_duplicate_ingredients(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    ShoppingList = apps.get_model('recipes', 'ShoppingList')
+    duplicates = (Ingredient.objects.order_by()
+                  .values('name', 'measurement_unit')
+                  .annotate(keep_id=Min('id'), total=Count('id'))
+                  .filter(total__gt=1))
+    for row in duplicates:
+        extra_ids = list(Ingredient.objects.filter(
+            name=row['name'], measurement_unit=row['measurement_unit'],
+        ).exclude(id=row['keep_id']).values_list('id', flat=True))
+        recipes = merge_rows(IngredientRecipe, extra_ids, row['keep_id'],
+                             'recipe', MAX_AMOUNT)
+        merge_rows(ShoppingList, extra_ids, row['keep_id'], 'user')
+        # id ингредиента входит во фрагменты этих рецептов в кэше.
+        Recipe.objects.filter(id__in=recipes).update(
+            version=F('version') + 1)
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0025_recipe_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient'),
+        ),
+    ]
@@ -1,49 +1,52 @@
+from django.db.models import BooleanField, Exists, OuterRef, Q, Value
 from rest_framework import mixins
-from recipes.models import Recipe
+from recipes.models import Recipe, TagRecipe, UserRecipeLists
+
+USER_LIST_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def recipe_filter(query_params, user):
+    """Собирает фильтры рецептов в условия одного WHERE."""
+    conditions = []
+    author = query_params.getlist('author')
+    if author:
+        conditions.append(Q(author__in=author))
+    tags = query_params.getlist('tags')
+    if tags:
+        conditions.append(Exists(TagRecipe.objects.filter(
+            recipe=OuterRef('pk'), tag__slug__in=tags)))
+    for field in USER_LIST_FILTERS:
+        value = query_params.get(field)
+        if value not in ('0', '1'):
+            continue
+        if user.is_anonymous:
+            if value == '1':
+                conditions.append(Q(pk__in=[]))
+            continue
+        in_list = Exists(UserRecipeLists.objects.filter(
+            recipe=OuterRef('pk'), user=user, **{field: True}))
+        conditions.append(in_list if value == '1' else ~in_list)
+    return conditions
 
 
 class FilterModelMixin(mixins.ListModelMixin):
-    def get_queryset(self):
-        queryset = Recipe.objects.all()
-        author = self.request.query_params.getlist('author')
+    def annotate_user_lists(self, queryset, names=USER_LIST_FILTERS):
         user = self.request.user
-        if author != []:
-            queryset_author = Recipe.objects.filter(author__in=author)
-        else:
-            queryset_author = queryset
-        tags = self.request.query_params.getlist('tags')
-        if tags != []:
-            queryset_tag = Recipe.objects.filter(tags__slug__in=tags)
-        else:
-            queryset_tag = queryset
+        if user.is_anonymous:
+            return queryset.annotate(**{
+                name: Value(False, output_field=BooleanField())
+                for name in names})
+        user_lists = UserRecipeLists.objects.filter(recipe=OuterRef('pk'),
+                                                    user=user)
+        return queryset.annotate(**{
+            name: Exists(user_lists.filter(**{name: True}))
+            for name in names})
 
-        is_in_shopping_cart = self.request.query_params.get(
-            'is_in_shopping_cart')
-        if is_in_shopping_cart == '1':
-            queryset_shop = (user.recipes_list
-                             .filter(is_in_shopping_cart=True)
-                             .values('recipe'))
-        elif is_in_shopping_cart == '0':
-            queryset_shop = (user.recipes_list
-                             .filter(is_in_shopping_cart=True)
-                             .values('recipe'))
-            queryset_shop = queryset.exclude(id__in=queryset_shop)
-        else:
-            queryset_shop = queryset
-        is_favorited = self.request.query_params.get('is_favorited')
-        if is_favorited == '1':
-            queryset_fav = (user.recipes_list
-                            .filter(is_favorited=True)
-                            .values('recipe'))
-        elif is_favorited == '0':
-            queryset_fav = (user.recipes_list
-                            .filter(is_favorited=True)
-                            .values('recipe'))
-            queryset_fav = queryset.exclude(id__in=queryset_fav)
-        else:
-            queryset_fav = queryset
+    def get_user_list_fields(self):
+        return USER_LIST_FILTERS
 
-        return (queryset.filter(id__in=queryset_shop)
-                        .filter(id__in=queryset_fav)
-                        .filter(id__in=queryset_tag)
-                        .filter(id__in=queryset_author))
+    def get_queryset(self):
+        queryset = Recipe.objects.filter(
+            *recipe_filter(self.request.query_params, self.request.user))
+        return self.annotate_user_lists(queryset,
+                                        self.get_user_list_fields())
@@ -0,0 +1,20 @@
+class CounterFieldsMixin:
+    """Модель с денормализованными счётчиками.
+
+    Счётчики меняет только change_counter через F(). Полное сохранение
+    уже загруженного экземпляра записало бы в строку их старые значения,
+    поэтому save без update_fields пишет все поля, кроме счётчиков.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not args and not self._state.adding
+                and not kwargs.get('force_insert')
+                and kwargs.get('update_fields') is None):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred]
+        super().save(*args, **kwargs)
@@ -2,6 +2,9 @@ from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 
+from recipes.model_mixins import CounterFieldsMixin
+from recipes.storage import content_storage
+
 MAX_VALIDATOR = 32000
 MIN_VALIDATOR = 1
 
@@ -11,7 +14,8 @@ User = get_user_model()
 
 class Tag(models.Model):
     name = models.TextField(verbose_name='Название', max_length=32)
-    slug = models.SlugField(verbose_name='Уникальный слаг', max_length=32)
+    slug = models.SlugField(verbose_name='Уникальный слаг', max_length=32,
+                            unique=True)
 
     class Meta:
         verbose_name = 'Тег'
@@ -31,12 +35,16 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name', )
+        constraints = (
+            models.UniqueConstraint(fields=('name', 'measurement_unit'),
+                                    name='unique_ingredient'),
+        )
 
     def __str__(self):
         return f'{self.name} {self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class Recipe(CounterFieldsMixin, models.Model):
     name = models.TextField(verbose_name='Название', max_length=256)
     text = models.TextField(verbose_name='Описание', max_length=256)
     cooking_time = models.PositiveSmallIntegerField(
@@ -44,6 +52,7 @@ class Recipe(models.Model):
         validators=[MinValueValidator(MIN_VALIDATOR),
                     MaxValueValidator(MAX_VALIDATOR)])
     image = models.ImageField(upload_to='recipes/images/',
+                              storage=content_storage,
                               verbose_name='Изображение')
     tags = models.ManyToManyField(Tag, through='TagRecipe')
     ingredients = models.ManyToManyField(Ingredient,
@@ -60,11 +69,23 @@ class Recipe(models.Model):
                                    related_name='user_lists',
                                    related_query_name='recipe',
                                    verbose_name='Подписчики')
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном', default=0, editable=False)
+    shopping_cart_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок', default=0, editable=False)
+    version = models.PositiveIntegerField(
+        verbose_name='Версия', default=0, editable=False)
+
+    # version, как и счётчики, меняется только через F() (recipes.fragments).
+    counter_fields = ('favorites_count', 'shopping_cart_count', 'version')
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('name', )
+        indexes = (
+            models.Index(fields=('name', 'id'), name='recipe_name_id_idx'),
+        )
 
     def __str__(self):
         return self.name
@@ -82,6 +103,10 @@ class TagRecipe(models.Model):
         verbose_name = 'Тег рецепта'
         verbose_name_plural = 'Теги рецепта'
         ordering = ('tag', )
+        constraints = (
+            models.UniqueConstraint(fields=('recipe', 'tag'),
+                                    name='unique_recipe_tag'),
+        )
 
     def __str__(self):
         return f'{self.tag} {self.recipe}'
@@ -103,6 +128,10 @@ class IngredientRecipe(models.Model):
         verbose_name = 'Ингредиент рецепта'
         verbose_name_plural = 'Ингредиенты рецепта'
         ordering = ('ingredient', )
+        constraints = (
+            models.UniqueConstraint(fields=('recipe', 'ingredient'),
+                                    name='unique_recipe_ingredient'),
+        )
 
     def __str__(self):
         return f'{self.ingredient} {self.recipe} {self.amount}'
@@ -123,6 +152,97 @@ class UserRecipeLists(models.Model):
     class Meta:
         verbose_name = 'В избранном у пользователя'
         verbose_name_plural = 'В избранном у пользователей'
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'recipe'),
+                                    condition=models.Q(is_favorited=True),
+                                    name='unique_user_favorite'),
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                condition=models.Q(is_in_shopping_cart=True),
+                name='unique_user_shopping_cart'),
+        )
+
+    def __str__(self):
+        return f'{self.user} {self.recipe}'
+
+
+class TableVersion(models.Model):
+    name = models.CharField(verbose_name='Таблица', max_length=64,
+                            unique=True)
+    version = models.PositiveBigIntegerField(verbose_name='Версия',
+                                             default=0)
+    updated_at = models.DateTimeField(verbose_name='Изменена',
+                                      auto_now=True)
+
+    class Meta:
+        verbose_name = 'Версия таблицы'
+        verbose_name_plural = 'Версии таблиц'
+
+    def __str__(self):
+        return f'{self.name} {self.version}'
+
+
+class CacheCounter(models.Model):
+    name = models.CharField(verbose_name='Счётчик', max_length=64,
+                            unique=True)
+    value = models.PositiveBigIntegerField(verbose_name='Значение',
+                                           default=0)
+
+    class Meta:
+        verbose_name = 'Счётчик кэша'
+        verbose_name_plural = 'Счётчики кэша'
+
+    def __str__(self):
+        return f'{self.name} {self.value}'
+
+
+class ShoppingList(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='shopping_list',
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredient, on_delete=models.CASCADE,
+                                   related_name='shopping_lists',
+                                   verbose_name='Ингредиент')
+    amount = models.PositiveIntegerField(verbose_name='Количество',
+                                         default=0)
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Списки покупок'
+        ordering = ('ingredient', )
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'ingredient'),
+                                    name='unique_user_shopping_ingredient'),
+        )
+
+    def __str__(self):
+        return f'{self.user} {self.ingredient} {self.amount}'
+
+
+class FeedItem(models.Model):
+    """Рецепт в ленте подписчика."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='feed',
+                             verbose_name='Подписчик')
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE,
+                               related_name='feed_items',
+                               verbose_name='Рецепт')
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name='+',
+                               verbose_name='Автор')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        ordering = ('-recipe', )
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'recipe'),
+                                    name='unique_user_feed_recipe'),
+        )
+        indexes = (
+            models.Index(fields=('user', 'author'),
+                         name='feed_user_author_idx'),
+        )
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
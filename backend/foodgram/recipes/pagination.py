@@ -0,0 +1,6 @@
+from user.pagination import KeysetPagination
+
+
+class FeedPagination(KeysetPagination):
+    """Лента: новые рецепты первыми, позиция — id рецепта в FeedItem."""
+    ordering = ('-feed_position', )
@@ -0,0 +1,261 @@
+"""Потоковый рендер списка покупок в PDF.
+
+Шрифт регистрируется один раз на процесс, шаблон страницы (поля,
+заголовок, метрики строк) собирается при импорте и переиспользуется
+всеми запросами воркера. Документ пишется постранично: каждая страница
+отдаётся клиенту сразу после формирования, а шрифт (подмножество
+использованных глифов), дерево страниц и таблица xref дописываются
+в конце, поэтому в памяти держится не больше одной страницы.
+"""
+import logging
+import threading
+import time
+import zlib
+from pathlib import Path
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import (FF_NONSYMBOLIC, FF_SYMBOLIC, SUBSETN,
+                                       TTFont, makeToUnicodeCMap)
+
+TEXT_ORIGIN_SIZE = 10.8
+FONT_SIZE = 16
+FONT_NAME = 'DejaVuSerif'
+FONT_PATH = Path(__file__).resolve().parent / 'fonts' / 'DejaVuSerif.ttf'
+HEADER = 'Список покупок'
+PDF_FONT = 'F1'
+CATALOG, PAGES, RESOURCES = 1, 2, 3
+
+logger = logging.getLogger(__name__)
+_font_lock = threading.Lock()
+
+
+def register_font():
+    """Регистрирует шрифт, если он ещё не загружен; возвращает время."""
+    if FONT_NAME in pdfmetrics.getRegisteredFontNames():
+        return 0
+    with _font_lock:
+        if FONT_NAME in pdfmetrics.getRegisteredFontNames():
+            return 0
+        start = time.perf_counter()
+        pdfmetrics.registerFont(TTFont(FONT_NAME, str(FONT_PATH)))
+        return time.perf_counter() - start
+
+
+class PageTemplate:
+    """Поля, заголовок и метрики строк страницы."""
+
+    def __init__(self, pagesize=A4, margin=inch,
+                 top=TEXT_ORIGIN_SIZE * inch, font_size=FONT_SIZE,
+                 header=HEADER):
+        self.pagesize = pagesize
+        self.margin = margin
+        self.top = top
+        self.font_size = font_size
+        self.leading = font_size * 1.2
+        self.header = header
+        self.width = pagesize[0] - 2 * margin
+        self.lines_per_page = int((top - margin) // self.leading) + 1
+
+    def wrap(self, line):
+        """Разбивает строку по словам так, чтобы она влезла в ширину."""
+        if self.fits(line):
+            return [line]
+        rows, current = [], ''
+        for word in line.split(' '):
+            candidate = f'{current} {word}' if current else word
+            if self.fits(candidate):
+                current = candidate
+                continue
+            if current:
+                rows.append(current)
+            current = ''
+            for char in word:
+                if current and not self.fits(current + char):
+                    rows.append(current)
+                    current = ''
+                current += char
+        rows.append(current)
+        return rows
+
+    def fits(self, text):
+        return (pdfmetrics.stringWidth(text, FONT_NAME, self.font_size)
+                <= self.width)
+
+
+SHOPPING_LIST_TEMPLATE = PageTemplate()
+
+
+def shopping_list_line(ingredient):
+    return (f"{ingredient['name']} ({ingredient['measurement_unit']})"
+            f" - {ingredient['amount']}")
+
+
+def pdf_string(data):
+    return b'(' + (data.replace(b'\\', b'\\\\').replace(b'(', b'\\(')
+                   .replace(b')', b'\\)').replace(b'\r', b'\\r')
+                   .replace(b'\n', b'\\n')) + b')'
+
+
+def pdf_dict(**entries):
+    return ('<< ' + ' '.join(f'/{key} {value}'
+                             for key, value in entries.items())
+            + ' >>').encode()
+
+
+class ShoppingListPDF:
+    """Итерируемый PDF: отдаёт документ кусками по странице."""
+
+    def __init__(self, ingredients, template=SHOPPING_LIST_TEMPLATE):
+        self.ingredients = ingredients
+        self.template = template
+        self.timings = {'font': register_font() * 1000, 'render': 0}
+        self.font = pdfmetrics.getFont(FONT_NAME)
+        self.offsets = {}
+        self.position = 0
+        self.next_object = RESOURCES + 1
+        self.pages = []
+
+    def __iter__(self):
+        chunks = self.chunks()
+        try:
+            while True:
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                self.timings['render'] += (time.perf_counter() - start) * 1000
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            self.font.state.pop(self, None)
+            logger.debug('Shopping list PDF: %d pages, %s', len(self.pages),
+                         self.timings)
+
+    def chunks(self):
+        yield self.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        yield self.write_object(CATALOG, pdf_dict(
+            Type='/Catalog', Pages=f'{PAGES} 0 R'))
+        for lines in self.paginate():
+            yield self.render_page(lines)
+        yield self.finish()
+
+    def paginate(self):
+        lines = []
+        if self.template.header:
+            lines = [self.template.header, '']
+        for ingredient in self.ingredients:
+            for row in self.template.wrap(shopping_list_line(ingredient)):
+                lines.append(row)
+                if len(lines) == self.template.lines_per_page:
+                    yield lines
+                    lines = []
+        if lines or not self.pages:
+            yield lines
+
+    def allocate(self):
+        number = self.next_object
+        self.next_object += 1
+        return number
+
+    def write(self, data):
+        self.position += len(data)
+        return data
+
+    def write_object(self, number, body, stream=None):
+        self.offsets[number] = self.position
+        data = f'{number} 0 obj\n'.encode() + body
+        if stream is not None:
+            data += b'\nstream\n' + stream + b'\nendstream'
+        return self.write(data + b'\nendobj\n')
+
+    def write_stream(self, number, content, **entries):
+        content = zlib.compress(content)
+        return self.write_object(
+            number,
+            pdf_dict(Length=len(content), Filter='/FlateDecode', **entries),
+            content)
+
+    def render_page(self, lines):
+        template = self.template
+        content = [b'BT', f'{template.margin:.2f} {template.top:.2f} Td '
+                   f'{template.leading:.2f} TL'.encode()]
+        for line in lines:
+            for subset, text in self.font.splitString(line, self):
+                content.append(f'/{PDF_FONT}+{subset} '
+                               f'{template.font_size} Tf '.encode()
+                               + pdf_string(text) + b' Tj')
+            content.append(b'T*')
+        content.append(b'ET')
+        content_number, page_number = self.allocate(), self.allocate()
+        self.pages.append(page_number)
+        width, height = template.pagesize
+        return (self.write_stream(content_number, b'\n'.join(content))
+                + self.write_object(page_number, pdf_dict(
+                    Type='/Page', Parent=f'{PAGES} 0 R',
+                    MediaBox=f'[0 0 {width:.2f} {height:.2f}]',
+                    Resources=f'{RESOURCES} 0 R',
+                    Contents=f'{content_number} 0 R')))
+
+    def render_fonts(self):
+        face = self.font.face
+        state = self.font.state.get(self)
+        subsets = state.subsets if state is not None else [[0]]
+        fonts, data = {}, b''
+        flags = (face.flags & ~FF_NONSYMBOLIC) | FF_SYMBOLIC
+        for number, subset in enumerate(subsets):
+            base_font = b''.join(
+                (SUBSETN(number), b'+', face.name, face.subfontNameX)
+            ).decode('latin-1')
+            file_number, descriptor_number, cmap_number, font_number = (
+                self.allocate() for _ in range(4))
+            font_file = face.makeSubset(subset)
+            data += self.write_stream(file_number, font_file,
+                                      Length1=len(font_file))
+            data += self.write_object(descriptor_number, pdf_dict(
+                Type='/FontDescriptor', FontName=f'/{base_font}',
+                Ascent=face.ascent, CapHeight=face.capHeight,
+                Descent=face.descent, Flags=flags,
+                FontBBox='[{}]'.format(' '.join(map(str, face.bbox))),
+                ItalicAngle=face.italicAngle, StemV=face.stemV,
+                MissingWidth=face.defaultWidth,
+                FontFile2=f'{file_number} 0 R'))
+            data += self.write_stream(
+                cmap_number, makeToUnicodeCMap(base_font, subset).encode())
+            widths = ' '.join(str(face.getCharWidth(code))
+                              for code in subset)
+            data += self.write_object(font_number, pdf_dict(
+                Type='/Font', Subtype='/TrueType', BaseFont=f'/{base_font}',
+                FirstChar=0, LastChar=len(subset) - 1,
+                Widths=f'[{widths}]',
+                FontDescriptor=f'{descriptor_number} 0 R',
+                ToUnicode=f'{cmap_number} 0 R'))
+            fonts[f'{PDF_FONT}+{number}'] = f'{font_number} 0 R'
+        data += self.write_object(RESOURCES, pdf_dict(
+            Font=pdf_dict(**fonts).decode()))
+        return data
+
+    def finish(self):
+        data = self.render_fonts()
+        kids = ' '.join(f'{number} 0 R' for number in self.pages)
+        data += self.write_object(PAGES, pdf_dict(
+            Type='/Pages', Kids=f'[{kids}]', Count=len(self.pages)))
+        xref_position = self.position
+        xref = [f'xref\n0 {self.next_object}\n', '0000000000 65535 f \n']
+        xref += [f'{self.offsets[number]:010d} 00000 n \n'
+                 for number in range(1, self.next_object)]
+        trailer = (f'trailer\n<< /Size {self.next_object} '
+                   f'/Root {CATALOG} 0 R >>\nstartxref\n{xref_position}\n'
+                   '%%EOF\n')
+        return data + self.write(''.join(xref).encode() + trailer.encode())
+
+
+def render_shopping_list(ingredients, template=SHOPPING_LIST_TEMPLATE):
+    """Собирает PDF целиком; возвращает байты и время в мс."""
+    document = ShoppingListPDF(ingredients, template)
+    return b''.join(document), document.timings
+
+
+def server_timing(timings):
+    return ', '.join(f'{name};dur={duration:.1f}'
+                     for name, duration in timings.items())
@@ -0,0 +1,154 @@
+"""Фоновый рендер PDF списка покупок.
+
+Задача идентифицируется хешем содержимого корзины и живёт в каталоге
+своего пользователя внутри SHOPPING_LIST_PDF_DIR: одинаковые корзины
+одного пользователя получают один и тот же файл, а чужие задачи
+недоступны даже по известному id. Готовый файл ``<хеш>.pdf`` виден
+всем воркерам сервера, метка «в работе» ``<хеш>.part`` создаётся
+атомарно (O_EXCL), так что один и тот же список рендерится только
+один раз. Сам рендер выполняется в пуле процессов, не занимая воркер
+запроса. Процессы пула запускает forkserver: fork из многопоточного
+воркера унаследовал бы захваченные другими потоками блокировки.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+
+from recipes.pdf import ShoppingListPDF
+
+PENDING, DONE, STALE = 'pending', 'done', 'stale'
+
+logger = logging.getLogger(__name__)
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def pool_size():
+    """Доля воркера в SHOPPING_LIST_PDF_WORKERS — процессах на весь хост."""
+    return max(1, settings.SHOPPING_LIST_PDF_WORKERS
+               // settings.WEB_CONCURRENCY)
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                pool_size(),
+                mp_context=multiprocessing.get_context('forkserver'))
+        return _pool
+
+
+def job_id(ingredients):
+    """Хеш агрегированного содержимого корзины."""
+    content = json.dumps(ingredients, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def job_dir(user_id):
+    return Path(settings.SHOPPING_LIST_PDF_DIR) / str(user_id)
+
+
+def result_path(user_id, job):
+    return job_dir(user_id) / f'{job}.pdf'
+
+
+def pending_path(user_id, job):
+    return job_dir(user_id) / f'{job}.part'
+
+
+def job_status(user_id, job):
+    """Возвращает DONE, PENDING, STALE (рендер завис или упал) или None."""
+    if result_path(user_id, job).exists():
+        return DONE
+    try:
+        started = pending_path(user_id, job).stat().st_mtime
+    except FileNotFoundError:
+        return None
+    if time.time() - started > settings.SHOPPING_LIST_PDF_TIMEOUT:
+        return STALE
+    return PENDING
+
+
+def render_job(ingredients, result, marker):
+    """Выполняется в процессе пула: пишет PDF и атомарно публикует его.
+
+    Пути вычисляет родительский процесс: настройки в процессе пула
+    остаются такими, какими были при его запуске.
+    """
+    # У каждого рендера свой временный файл: повторный запуск после
+    # просроченной метки не смешает свои куски с чужими.
+    path = result.with_name(f'{result.stem}.{uuid.uuid4().hex}.tmp')
+    try:
+        with open(path, 'wb') as file:
+            for chunk in ShoppingListPDF(ingredients):
+                file.write(chunk)
+        os.replace(path, result)
+    finally:
+        path.unlink(missing_ok=True)
+    marker.unlink(missing_ok=True)
+
+
+def remove_expired():
+    deadline = time.time() - settings.SHOPPING_LIST_PDF_TTL
+    for pattern in ('*/*.pdf', '*/*.tmp'):
+        for path in Path(settings.SHOPPING_LIST_PDF_DIR).glob(pattern):
+            try:
+                if path.stat().st_mtime < deadline:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def remove_stale(path):
+    """Удаляет метку, если она всё ещё просрочена."""
+    try:
+        started = path.stat().st_mtime
+    except FileNotFoundError:
+        return
+    if time.time() - started > settings.SHOPPING_LIST_PDF_TIMEOUT:
+        path.unlink(missing_ok=True)
+
+
+def _finished(user_id, job, future):
+    if future.exception() is not None:
+        logger.error('Shopping list job %s failed', job,
+                     exc_info=future.exception())
+        pending_path(user_id, job).unlink(missing_ok=True)
+        return
+    remove_expired()
+
+
+def submit(user_id, ingredients):
+    """Ставит рендер в очередь, если такой PDF ещё не готов и не в работе.
+
+    Возвращает id задачи и её статус.
+    """
+    job = job_id(ingredients)
+    status = job_status(user_id, job)
+    if status == DONE:
+        os.utime(result_path(user_id, job))
+        return job, DONE
+    if status == PENDING:
+        return job, PENDING
+    path = pending_path(user_id, job)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if status == STALE:
+        remove_stale(path)
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return job, PENDING
+    future = get_pool().submit(render_job, ingredients,
+                               result_path(user_id, job), path)
+    future.add_done_callback(lambda future: _finished(user_id, job, future))
+    return job, PENDING
@@ -0,0 +1,142 @@
+"""Индекс поиска ингредиентов по префиксу и подстроке.
+
+Индекс собирается в файл командой index_ingredients и отображается
+в память каждым воркером, так что воркеры делят одну копию данных
+через страничный кэш ОС.
+
+Формат файла: заголовок (сигнатура, число записей), таблица смещений
+строк и блок строк вида ``ключ␟id␟название␟единица\\n``,
+отсортированных по ключу (названию в нижнем регистре).
+"""
+import mmap
+import os
+import struct
+import threading
+
+from django.conf import settings
+
+MAGIC = b'FGI1'
+HEADER = struct.Struct('<4sI')
+OFFSET = struct.Struct('<I')
+SEPARATOR = b'\x1f'
+NEWLINE = b'\n'
+
+
+def _clean(value):
+    return value.replace('\x1f', ' ').replace('\n', ' ')
+
+
+def build_index(ingredients, path=None):
+    """Записывает индекс из пар (id, name, measurement_unit)."""
+    path = str(path or settings.INGREDIENT_INDEX_PATH)
+    lines = sorted(
+        (_clean(name).lower().encode(), pk, _clean(name),
+         _clean(measurement_unit))
+        for pk, name, measurement_unit in ingredients)
+    offsets = []
+    text = bytearray()
+    for key, pk, name, measurement_unit in lines:
+        offsets.append(len(text))
+        text += SEPARATOR.join(
+            (key, str(pk).encode(), name.encode(), measurement_unit.encode()))
+        text += NEWLINE
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(offsets)))
+        for offset in offsets:
+            f.write(OFFSET.pack(offset))
+        f.write(text)
+    os.replace(tmp_path, path)
+    return len(offsets)
+
+
+def rebuild_index():
+    from recipes.models import Ingredient
+
+    return build_index(Ingredient.objects.values_list(
+        'id', 'name', 'measurement_unit').order_by())
+
+
+class IngredientIndex:
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.mtime = os.fstat(f.fileno()).st_mtime_ns
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} не является индексом ингредиентов')
+        self.text_start = HEADER.size + OFFSET.size * self.count
+
+    def _line_start(self, position):
+        offset, = OFFSET.unpack_from(self.data,
+                                     HEADER.size + OFFSET.size * position)
+        return self.text_start + offset
+
+    def _key(self, start):
+        return self.data[start:self.data.find(SEPARATOR, start)]
+
+    def _record(self, start):
+        line = self.data[start:self.data.find(NEWLINE, start)]
+        _, pk, name, measurement_unit = line.split(SEPARATOR)
+        return {'id': int(pk), 'name': name.decode(),
+                'measurement_unit': measurement_unit.decode()}
+
+    def _prefix(self, query):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(self._line_start(middle)) < query:
+                low = middle + 1
+            else:
+                high = middle
+        for position in range(low, self.count):
+            start = self._line_start(position)
+            if not self._key(start).startswith(query):
+                break
+            yield start
+
+    def _substring(self, query):
+        position = self.data.find(query, self.text_start)
+        while position != -1:
+            start = self.data.rfind(NEWLINE, self.text_start, position) + 1
+            start = max(start, self.text_start)
+            key_end = self.data.find(SEPARATOR, start)
+            if start < position and position + len(query) <= key_end:
+                yield start
+            next_line = self.data.find(NEWLINE, position) + 1
+            if next_line == 0:
+                break
+            position = self.data.find(query, next_line)
+
+    def search(self, query, limit=None):
+        """Сначала совпадения по префиксу, затем по подстроке."""
+        query = _clean(query).lower().encode()
+        result = []
+        for matches in (self._prefix(query), self._substring(query)):
+            for start in matches:
+                if limit is not None and len(result) >= limit:
+                    return result
+                result.append(self._record(start))
+        return result
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_index():
+    """Текущий индекс или None, если файл ещё не собран."""
+    global _index
+    path = str(settings.INGREDIENT_INDEX_PATH)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    index = _index
+    if index is not None and index.mtime == mtime:
+        return index
+    with _lock:
+        if _index is None or _index.mtime != mtime:
+            _index = IngredientIndex(path)
+        return _index
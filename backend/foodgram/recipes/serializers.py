@@ -1,15 +1,29 @@
 import base64
+from collections import OrderedDict
+
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Manager, Prefetch, prefetch_related_objects
 from django.core.files.base import ContentFile
 from rest_framework import serializers
 
-from recipes.models import (Ingredient, IngredientRecipe, Recipe, Tag,
-                            TagRecipe)
+from recipes.fieldsets import SparseFieldsetMixin
+from recipes.fragments import get_fragments, set_fragments
+from recipes.images import RECIPE_VARIANTS, strip_metadata, variant_urls
+from recipes.models import (Ingredient, IngredientRecipe, Recipe,
+                            ShoppingList, Tag, TagRecipe)
+from recipes.shopping_list import batched_changes, change_recipe
 from user.serializers import CustomUserSerializer
 
 MAX_VALUE = 32000
 MIN_VALUE = 1
+USER_FIELDS = ('is_favorited', 'is_in_shopping_cart')
+RECIPE_PREFETCH = {
+    'tags': 'tags',
+    'ingredients': Prefetch(
+        'recipe_ingredients',
+        queryset=IngredientRecipe.objects.select_related('ingredient')),
+}
 
 User = get_user_model()
 
@@ -25,7 +39,7 @@ class Base64ImageField(serializers.ImageField):
 
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
 
-        return super().to_internal_value(data)
+        return strip_metadata(super().to_internal_value(data))
 
 
 class IngredientsSerializer(serializers.ModelSerializer):
@@ -57,12 +71,12 @@ class TagsSerializer(serializers.ModelSerializer):
         read_only_field = ('name', 'slug')
 
     def to_internal_value(self, data):
+        """Id тега; сами теги загружает RecipeSerializer одним запросом."""
         try:
-            tag = Tag.objects.get(pk=data)
-        except Tag.DoesNotExist:
-            raise serializers.ValidationError(f'{id} - такого тега '
+            return int(data)
+        except (TypeError, ValueError):
+            raise serializers.ValidationError(f'{data} - такого тега '
                                               f'не существует')
-        return tag
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -81,50 +95,118 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'text', 'cooking_time', 'id', 'author')
         read_only_field = ('id', 'author')
 
+    def validate(self, data):
+        tags = data.get('tags', [])
+        if len(tags) != len(set(tags)):
+            raise serializers.ValidationError(
+                {'tags': 'Теги не должны повторяться'})
+        ingredients = [ingredient['ingredient']['id']
+                       for ingredient in data.get('recipe_ingredients', [])]
+        if len(ingredients) != len(set(ingredients)):
+            raise serializers.ValidationError(
+                {'ingredients': 'Ингредиенты не должны повторяться'})
+        if 'tags' in data:
+            data['tags'] = self.resolve(Tag, tags, 'tags',
+                                        'такого тега не существует')
+        if ingredients:
+            self.resolve(Ingredient, ingredients, 'ingredients',
+                         'такого ингредиента не существует')
+        return data
+
+    @staticmethod
+    def resolve(model, ids, field, message):
+        """Загружает объекты одним запросом, сохраняя порядок ids."""
+        objects = model.objects.in_bulk(ids)
+        missing = [str(pk) for pk in ids if pk not in objects]
+        if missing:
+            raise serializers.ValidationError(
+                {field: f'{", ".join(missing)} - {message}'})
+        return [objects[pk] for pk in ids]
+
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('recipe_ingredients')
         user = self.context['request'].user
         recipe = Recipe.objects.create(**validated_data, author=user)
-        self.tags_create(tags, recipe)
-        self.ingredients_create(ingredients, recipe)
+        self.set_tags(recipe, tags, created=True)
+        self.set_ingredients(recipe, ingredients, created=True)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('recipe_ingredients')
-        recipe, status = Recipe.objects.update_or_create(
-            pk=instance.id,
-            defaults={**validated_data})
-        instance.recipe_tags.all().delete()
-        instance.recipe_ingredients.all().delete()
-        self.tags_create(tags, recipe)
-        self.ingredients_create(ingredients, recipe)
-        return recipe
-
-    def ingredients_create(self, ingredients, recipe):
-        ingredients_array = []
-        for ingredient in ingredients:
-            ingredients_array.append(IngredientRecipe(
-                ingredient=get_object_or_404(
-                    Ingredient,
-                    pk=ingredient['ingredient']['id']),
-                recipe=recipe, amount=ingredient['amount']))
-        IngredientRecipe.objects.bulk_create(ingredients_array)
-
-    def tags_create(self, tags, recipe):
-        tags_array = []
-        for tag in tags:
-            tags_array.append(TagRecipe(tag=tag, recipe=recipe))
-        TagRecipe.objects.bulk_create(tags_array)
-
-
-class RecipeListSerializer(serializers.ModelSerializer):
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('recipe_ingredients', None)
+        if tags is not None:
+            self.set_tags(instance, tags)
+        if ingredients is not None:
+            self.set_ingredients(instance, ingredients)
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        # Сохранение идёт последним: его post_save меняет версию рецепта
+        # уже после массовой записи тегов и ингредиентов, которая сигналов
+        # не шлёт. Пустой update_fields не отправил бы post_save, а полное
+        # сохранение счётчики и версию всё равно не пишет.
+        instance.save(update_fields=list(validated_data) or None)
+        return instance
+
+    def set_tags(self, recipe, tags, created=False):
+        """Приводит теги рецепта к списку, меняя только разницу."""
+        wanted = {tag.id for tag in tags}
+        current = set() if created else set(
+            recipe.recipe_tags.values_list('tag_id', flat=True))
+        if current - wanted:
+            recipe.recipe_tags.filter(tag_id__in=current - wanted).delete()
+        TagRecipe.objects.bulk_create(
+            TagRecipe(tag_id=tag_id, recipe=recipe)
+            for tag_id in wanted - current)
+
+    def set_ingredients(self, recipe, ingredients, created=False):
+        """Приводит ингредиенты рецепта к списку, меняя только разницу."""
+        wanted = {ingredient['ingredient']['id']: ingredient['amount']
+                  for ingredient in ingredients}
+        current = {} if created else {
+            row.ingredient_id: row for row in recipe.recipe_ingredients.all()}
+        changed = [row for ingredient_id, row in current.items()
+                   if ingredient_id in wanted
+                   and wanted[ingredient_id] != row.amount]
+        deltas = {row.ingredient_id: wanted[row.ingredient_id] - row.amount
+                  for row in changed}
+        with batched_changes():
+            removed = current.keys() - wanted.keys()
+            if removed:
+                recipe.recipe_ingredients.filter(
+                    ingredient_id__in=removed).delete()
+            for row in changed:
+                row.amount = wanted[row.ingredient_id]
+            IngredientRecipe.objects.bulk_update(changed, ('amount', ))
+            added = [IngredientRecipe(ingredient_id=ingredient_id,
+                                      recipe=recipe, amount=amount)
+                     for ingredient_id, amount in wanted.items()
+                     if ingredient_id not in current]
+            IngredientRecipe.objects.bulk_create(added)
+            deltas.update((row.ingredient_id, row.amount) for row in added)
+            change_recipe(recipe.id, deltas)
+
+
+class CachedRecipeListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        recipes = list(data.all() if isinstance(data, Manager) else data)
+        if self.child.is_sparse():
+            self.child.prefetch(recipes)
+        else:
+            self.child.load_fragments(recipes)
+        return super().to_representation(recipes)
+
+
+class RecipeListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Recipe."""
     image = serializers.SerializerMethodField(
         'get_image_url',
         read_only=True,
     )
+    image_variants = serializers.SerializerMethodField(read_only=True)
     tags = TagsSerializer(many=True,)
     ingredients = IngredientsRecipeSerializer(many=True,
                                               source='recipe_ingredients')
@@ -142,11 +224,70 @@ class RecipeListSerializer(serializers.ModelSerializer):
         """Meta class."""
 
         model = Recipe
-        fields = ('id', 'ingredients', 'tags', 'image', 'name',
-                  'text', 'cooking_time', 'is_favorited', 'author',
+        fields = ('id', 'ingredients', 'tags', 'image', 'image_variants',
+                  'name', 'text', 'cooking_time', 'is_favorited', 'author',
                   'is_in_shopping_cart')
         read_only_field = ('id', 'author', 'is_favorited',
                            'is_in_shopping_cart')
+        list_serializer_class = CachedRecipeListSerializer
+
+    fragments = None
+
+    def is_sparse(self):
+        """Выбрана часть полей: такой ответ не кэшируется фрагментами."""
+        return len(self.fields) < len(self.Meta.fields)
+
+    def prefetch(self, recipes):
+        prefetch_related_objects(recipes, *(
+            lookup for field, lookup in RECIPE_PREFETCH.items()
+            if field in self.fields))
+
+    def load_fragments(self, recipes):
+        """Берёт общие части рецептов из кэша, недостающие рендерит."""
+        keys, fragments = get_fragments(recipes)
+        missing = [recipe for recipe in recipes if recipe.id not in fragments]
+        prefetch_related_objects(missing, *RECIPE_PREFETCH.values())
+        rendered = {}
+        for recipe in missing:
+            fragments[recipe.id] = self.shared_representation(recipe)
+            rendered[keys[recipe.id]] = fragments[recipe.id]
+        set_fragments(rendered)
+        self.fragments = fragments
+
+    def shared_representation(self, instance):
+        self.set_author_subscription(instance)
+        data = super().to_representation(instance)
+        for field in USER_FIELDS:
+            data.pop(field)
+        data['author'].pop('is_subscribed')
+        return data
+
+    def set_author_subscription(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+
+    def to_representation(self, instance):
+        if self.is_sparse():
+            self.set_author_subscription(instance)
+            return super().to_representation(instance)
+        if self.fragments is None or instance.id not in self.fragments:
+            self.load_fragments([instance])
+        fragment = self.fragments[instance.id]
+        overlay = {
+            'is_favorited': self.get_is_favorited(instance),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(instance),
+            'author': OrderedDict(
+                fragment['author'],
+                is_subscribed=self.get_author_is_subscribed(instance)),
+        }
+        return OrderedDict(
+            (field, overlay[field] if field in overlay else fragment[field])
+            for field in self.Meta.fields)
+
+    def get_author_is_subscribed(self, obj):
+        if hasattr(obj, 'author_is_subscribed'):
+            return obj.author_is_subscribed
+        return self.fields['author'].get_is_subscribed(obj.author)
 
     def get_image_url(self, obj):
         """Image function."""
@@ -154,13 +295,20 @@ class RecipeListSerializer(serializers.ModelSerializer):
             return obj.image.url
         return None
 
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image.name, RECIPE_VARIANTS)
+
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_anonymous:
             return False
         return user.recipes_list.filter(recipe=obj, is_favorited=True).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if user.is_anonymous:
             return False
@@ -173,13 +321,15 @@ class FavoriteRecipeSerializer(serializers.ModelSerializer):
         'get_image_url',
         read_only=True,
     )
+    image_variants = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         """Meta class."""
 
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time', )
-        read_only_field = ('id', 'name', 'image', 'cooking_time', )
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time', )
+        read_only_field = ('id', 'name', 'image', 'image_variants',
+                           'cooking_time', )
 
     def get_image_url(self, obj):
         """Image function."""
@@ -187,8 +337,54 @@ class FavoriteRecipeSerializer(serializers.ModelSerializer):
             return obj.image.url
         return None
 
+    def get_image_variants(self, obj):
+        return variant_urls(obj.image.name, RECIPE_VARIANTS)
+
+
+class ShoppingListSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
+
+    class Meta:
+        model = ShoppingList
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
 
 class DownloadShoppingCartSerializer(serializers.ModelSerializer):
     class Meta:
         """Meta class."""
         model = Recipe
+
+
+class IngredientRecordSerializer(serializers.Serializer):
+    name = serializers.CharField(max_length=128)
+    measurement_unit = serializers.CharField(max_length=64)
+    amount = serializers.IntegerField(max_value=MAX_VALUE,
+                                      min_value=MIN_VALUE)
+
+
+class RecipeRecordSerializer(serializers.Serializer):
+    """Строка NDJSON-импорта: связи заданы slug, username и названиями."""
+    name = serializers.CharField(max_length=256)
+    text = serializers.CharField(max_length=256)
+    cooking_time = serializers.IntegerField(max_value=MAX_VALUE,
+                                            min_value=MIN_VALUE)
+    image = serializers.CharField(max_length=100, required=False,
+                                  allow_blank=True, default='')
+    author = serializers.CharField(max_length=150)
+    tags = serializers.ListField(child=serializers.SlugField(),
+                                 allow_empty=False)
+    ingredients = IngredientRecordSerializer(many=True, allow_empty=False)
+
+    def validate(self, data):
+        if len(data['tags']) != len(set(data['tags'])):
+            raise serializers.ValidationError(
+                {'tags': 'Теги не должны повторяться'})
+        ingredients = [(ingredient['name'], ingredient['measurement_unit'])
+                       for ingredient in data['ingredients']]
+        if len(ingredients) != len(set(ingredients)):
+            raise serializers.ValidationError(
+                {'ingredients': 'Ингредиенты не должны повторяться'})
+        return data
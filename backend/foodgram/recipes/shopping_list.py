@@ -0,0 +1,154 @@
+"""Инкрементально поддерживаемые списки покупок пользователей."""
+import csv
+import json
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.db.models.functions import Greatest
+
+from recipes.models import IngredientRecipe, ShoppingList, UserRecipeLists
+
+CSV_FIELDS = ('name', 'measurement_unit', 'amount')
+
+_batch = threading.local()
+
+
+def cart_users(recipe_id):
+    return list(UserRecipeLists.objects.filter(
+        recipe=recipe_id, is_in_shopping_cart=True
+    ).values_list('user', flat=True))
+
+
+def change_items(user_ids, amounts):
+    """Прибавляет {ingredient_id: количество} к спискам пользователей."""
+    amounts = {pk: delta for pk, delta in amounts.items() if delta}
+    if not user_ids or not amounts:
+        return
+    ShoppingList.objects.bulk_create(
+        [ShoppingList(user_id=user_id, ingredient_id=ingredient_id)
+         for user_id in user_ids
+         for ingredient_id, delta in amounts.items() if delta > 0],
+        ignore_conflicts=True)
+    items = ShoppingList.objects.filter(user__in=user_ids,
+                                        ingredient__in=amounts)
+    items.update(amount=Greatest(F('amount') + Case(
+        *(When(ingredient=ingredient_id, then=Value(delta))
+          for ingredient_id, delta in amounts.items()),
+        output_field=IntegerField()), 0))
+    items.filter(amount=0).delete()
+
+
+def recipe_amounts(recipe_id, sign=1):
+    return {ingredient_id: sign * amount
+            for ingredient_id, amount in IngredientRecipe.objects.filter(
+                recipe=recipe_id).values_list('ingredient', 'amount')}
+
+
+def add_recipe(user_id, recipe_id):
+    change_items([user_id], recipe_amounts(recipe_id))
+
+
+def remove_recipe(user_id, recipe_id):
+    change_items([user_id], recipe_amounts(recipe_id, -1))
+
+
+def change_recipe(recipe_id, amounts):
+    """Переносит правку ингредиентов рецепта в списки покупок."""
+    amounts = {pk: delta for pk, delta in amounts.items() if delta}
+    if not amounts:
+        return
+    pending = getattr(_batch, 'recipes', None)
+    if pending is None:
+        change_items(cart_users(recipe_id), amounts)
+        return
+    recipe = pending.setdefault(recipe_id, {})
+    for ingredient_id, delta in amounts.items():
+        recipe[ingredient_id] = recipe.get(ingredient_id, 0) + delta
+
+
+@contextmanager
+def batched_changes():
+    """Копит правки рецептов и переносит их в списки одним проходом."""
+    if getattr(_batch, 'recipes', None) is not None:
+        yield
+        return
+    _batch.recipes = {}
+    try:
+        yield
+        pending = _batch.recipes
+    finally:
+        _batch.recipes = None
+    for recipe_id, amounts in pending.items():
+        change_recipe(recipe_id, amounts)
+
+
+def cart_totals(user_ids=None):
+    """Суммы ингредиентов корзин: строки user, ingredient, total."""
+    rows = UserRecipeLists.objects.filter(is_in_shopping_cart=True)
+    if user_ids is not None:
+        rows = rows.filter(user__in=user_ids)
+    return (rows.order_by()
+            .values('user', 'recipe__recipe_ingredients__ingredient')
+            .annotate(total=Sum('recipe__recipe_ingredients__amount'))
+            .filter(total__gt=0))
+
+
+def rebuild_shopping_list(user_id):
+    """Пересобирает список покупок пользователя из его корзины."""
+    with transaction.atomic():
+        # Правки корзины этого пользователя ждут конца пересборки.
+        list(UserRecipeLists.objects.select_for_update()
+             .filter(user=user_id).values_list('pk', flat=True))
+        ShoppingList.objects.filter(user=user_id).delete()
+        ShoppingList.objects.bulk_create(
+            ShoppingList(user_id=user_id,
+                         ingredient_id=row[
+                             'recipe__recipe_ingredients__ingredient'],
+                         amount=row['total'])
+            for row in cart_totals([user_id]))
+
+
+def rebuild_shopping_lists():
+    """Пересобирает все списки покупок, каждый в своей транзакции.
+
+    Возвращает число пересобранных списков.
+    """
+    user_ids = set(UserRecipeLists.objects.filter(
+        is_in_shopping_cart=True).values_list('user', flat=True).distinct())
+    # Списки без корзины пересобираются в пустые.
+    user_ids.update(
+        ShoppingList.objects.values_list('user', flat=True).distinct())
+    for user_id in sorted(user_ids):
+        rebuild_shopping_list(user_id)
+    return len(user_ids)
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def shopping_list_text(ingredients):
+    for ingredient in ingredients:
+        yield (f"{ingredient['name']} ({ingredient['measurement_unit']})"
+               f" - {ingredient['amount']}\n").encode()
+
+
+def shopping_list_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_FIELDS).encode()
+    for ingredient in ingredients:
+        yield writer.writerow(
+            [ingredient[field] for field in CSV_FIELDS]).encode()
+
+
+def shopping_list_json(ingredients):
+    separator = '['
+    for ingredient in ingredients:
+        yield (separator + json.dumps(
+            {field: ingredient[field] for field in CSV_FIELDS},
+            ensure_ascii=False)).encode()
+        separator = ','
+    yield (']' if separator == ',' else '[]').encode()
@@ -0,0 +1,198 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from recipes.conditional import bump_version
+from recipes.counters import USER_LIST_COUNTERS, change_counter
+from recipes.feed import backfill, fan_out, prune
+from recipes.fragments import AUTHOR_FIELDS, touch, touch_recipe
+from recipes.images import (AVATAR_VARIANTS, RECIPE_VARIANTS, has_variants,
+                            make_variants)
+from recipes.models import (Ingredient, IngredientRecipe, Recipe, Tag,
+                            TagRecipe, UserRecipeLists)
+from recipes.search import rebuild_index
+from recipes.shopping_list import add_recipe, change_recipe, remove_recipe
+from user.models import User, UserSubscription
+
+VERSIONED_MODELS = {
+    Tag: 'tag',
+    Ingredient: 'ingredient',
+    Recipe: 'recipe',
+    TagRecipe: 'recipe',
+    IngredientRecipe: 'recipe',
+    UserRecipeLists: 'userrecipelists',
+    UserSubscription: 'usersubscription',
+    User: 'user',
+}
+
+BUMPS = {name: partial(bump_version, name)
+         for name in set(VERSIONED_MODELS.values())}
+
+
+def on_commit_once(func):
+    """Откладывает вызов до коммита, не дублируя его в транзакции."""
+    pending = transaction.get_connection().run_on_commit
+    if all(callback[1] is not func for callback in pending):
+        transaction.on_commit(func)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    on_commit_once(rebuild_index)
+
+
+def table_changed(sender, update_fields=None, **kwargs):
+    # Вход пользователя меняет только last_login, которого нет в ответах.
+    if update_fields is not None and set(update_fields) == {'last_login'}:
+        return
+    on_commit_once(BUMPS[VERSIONED_MODELS[sender]])
+
+
+# Подключаем только к версионируемым моделям: приёмник post_delete
+# без sender отключил бы быстрое каскадное удаление во всём проекте.
+for model in VERSIONED_MODELS:
+    post_save.connect(table_changed, sender=model)
+    post_delete.connect(table_changed, sender=model)
+
+
+def build_variants(name, variants, table, recipes):
+    # До этого в ответах и кэше стоял адрес оригинала.
+    if make_variants(name, variants):
+        bump_version(table)
+        touch(recipes)
+
+
+def image_saved(file, variants, update_fields, table, recipes):
+    if not file or (update_fields is not None
+                    and file.field.name not in update_fields):
+        return
+    if not has_variants(file.name, variants):
+        transaction.on_commit(partial(build_variants, file.name, variants,
+                                      table, recipes))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(sender, instance, update_fields=None, **kwargs):
+    image_saved(instance.image, RECIPE_VARIANTS, update_fields, 'recipe',
+                Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=User)
+def avatar_saved(sender, instance, update_fields=None, **kwargs):
+    image_saved(instance.avatar, AVATAR_VARIANTS, update_fields, 'user',
+                Recipe.objects.filter(author=instance))
+
+
+# Версии рецептов — ключи их фрагментов в кэше (recipes.fragments).
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipe(instance)
+
+
+def recipe_relation_changed(sender, instance, **kwargs):
+    touch(Recipe.objects.filter(pk=instance.recipe_id))
+
+
+for model in (TagRecipe, IngredientRecipe):
+    post_save.connect(recipe_relation_changed, sender=model)
+    post_delete.connect(recipe_relation_changed, sender=model)
+
+
+# Удаление тега или ингредиента удаляет и связи, а с ними меняет версии.
+@receiver(post_save, sender=Tag)
+def tag_saved(sender, instance, created, **kwargs):
+    if not created:
+        touch(Recipe.objects.filter(recipe_tags__tag=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if not created:
+        touch(Recipe.objects.filter(recipe_ingredients__ingredient=instance))
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None
+                   and not set(update_fields) & set(AUTHOR_FIELDS)):
+        return
+    touch(Recipe.objects.filter(author=instance))
+
+
+@receiver(pre_save, sender=UserRecipeLists)
+def user_list_saving(sender, instance, **kwargs):
+    instance.saved_flags = (
+        UserRecipeLists.objects.filter(pk=instance.pk)
+        .values(*USER_LIST_COUNTERS).first() if instance.pk else None
+    ) or {}
+
+
+@receiver(post_save, sender=UserRecipeLists)
+def user_list_saved(sender, instance, **kwargs):
+    for flag, counter in USER_LIST_COUNTERS.items():
+        delta = (int(getattr(instance, flag))
+                 - int(instance.saved_flags.get(flag, False)))
+        if delta:
+            change_counter(Recipe, instance.recipe_id, counter, delta)
+        if delta and flag == 'is_in_shopping_cart':
+            change_cart = add_recipe if delta > 0 else remove_recipe
+            change_cart(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=UserRecipeLists)
+def user_list_deleted(sender, instance, **kwargs):
+    for flag, counter in USER_LIST_COUNTERS.items():
+        if getattr(instance, flag):
+            change_counter(Recipe, instance.recipe_id, counter, -1)
+    if instance.is_in_shopping_cart:
+        remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_save, sender=IngredientRecipe)
+def recipe_ingredient_saving(sender, instance, **kwargs):
+    instance.saved_amount = (
+        IngredientRecipe.objects.filter(pk=instance.pk)
+        .values_list('ingredient', 'amount').first() if instance.pk else None)
+
+
+@receiver(post_save, sender=IngredientRecipe)
+def recipe_ingredient_saved(sender, instance, **kwargs):
+    amounts = {instance.ingredient_id: instance.amount}
+    if instance.saved_amount is not None:
+        ingredient_id, amount = instance.saved_amount
+        amounts[ingredient_id] = amounts.get(ingredient_id, 0) - amount
+    change_recipe(instance.recipe_id, amounts)
+
+
+@receiver(post_delete, sender=IngredientRecipe)
+def recipe_ingredient_deleted(sender, instance, **kwargs):
+    change_recipe(instance.recipe_id,
+                  {instance.ingredient_id: -instance.amount})
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+        fan_out([instance])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=UserSubscription)
+def subscription_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.sub_id_id, 'subscribers_count', 1)
+        backfill(instance.person_id_id, instance.sub_id_id)
+
+
+@receiver(post_delete, sender=UserSubscription)
+def subscription_deleted(sender, instance, **kwargs):
+    change_counter(User, instance.sub_id_id, 'subscribers_count', -1)
+    prune(instance.person_id_id, instance.sub_id_id)
@@ -0,0 +1,73 @@
+"""Хранилище медиафайлов с адресацией по содержимому.
+
+Файл сохраняется под именем ``<каталог>/<xx>/<sha256><расширение>``,
+где каталог берётся из upload_to поля. Повторная загрузка того же
+изображения не пишет ничего нового, а возвращает имя уже лежащего
+блоба, поэтому один блоб может принадлежать нескольким записям.
+Неиспользуемые блобы удаляет команда collect_media.
+"""
+import hashlib
+import posixpath
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db.models import FileField
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK = 64 * 1024
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        try:
+            return super().save(name, content, max_length)
+        except FileExistsError:
+            return name
+
+    def content_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK):
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + extension)
+
+    def get_available_name(self, name, max_length=None):
+        # Блоб с таким содержимым уже есть: запись не нужна.
+        if self.exists(name):
+            raise FileExistsError(name)
+        return name
+
+
+content_storage = ContentAddressedStorage()
+
+
+def content_fields():
+    """Все файловые поля моделей, хранящие блобы в content_storage."""
+    return [field for model in apps.get_models()
+            for field in model._meta.get_fields()
+            if isinstance(field, FileField)
+            and isinstance(field.storage, ContentAddressedStorage)]
+
+
+def reference_counts():
+    """Число ссылок из БД на каждый блоб."""
+    counts = {}
+    for field in content_fields():
+        names = (field.model.objects.exclude(**{field.name: ''})
+                 .exclude(**{f'{field.name}__isnull': True})
+                 .values_list(field.name, flat=True))
+        for name in names.iterator():
+            counts[name] = counts.get(name, 0) + 1
+    return counts
@@ -0,0 +1,45 @@
+from django.db.models.signals import post_delete
+
+from recipes.models import FeedItem, Tag
+from recipes.tests.utils import CacheTestCase, client_for
+
+
+class ConditionalGetTest(CacheTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Без сигналов: иначе версия уже ждала бы коммита и повторная
+        # правка в тесте не добавила бы свой обработчик.
+        Tag.objects.bulk_create(Tag(name=f'Тег {number}',
+                                    slug=f'tag-{number}')
+                                for number in range(2))
+
+    def test_not_modified_until_table_changes(self):
+        client = client_for()
+        response = client.get('/api/tags/')
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+        response = client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Новый', slug='new')
+        response = client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data), 3)
+
+    def test_if_modified_since_alone_is_ignored(self):
+        response = client_for().get(
+            '/api/tags/',
+            HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_ingredient_search_is_conditional(self):
+        client = client_for()
+        etag = client.get('/api/ingredients/?name=а')['ETag']
+        response = client.get('/api/ingredients/?name=а',
+                              HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_unversioned_models_keep_fast_delete(self):
+        self.assertTrue(post_delete.has_listeners(Tag))
+        self.assertFalse(post_delete.has_listeners(FeedItem))
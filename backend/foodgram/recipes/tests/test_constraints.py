@@ -0,0 +1,94 @@
+from django.db import IntegrityError, transaction
+
+from recipes.models import (Ingredient, IngredientRecipe, Tag, TagRecipe,
+                            UserRecipeLists)
+from recipes.tests.utils import (CacheTestCase, TempMediaMixin, client_for,
+                                 image_data, make_ingredients, make_recipe,
+                                 make_tags, make_user)
+from user.models import UserSubscription
+
+
+class UniqueConstraintsTest(CacheTestCase):
+    """Повторные строки связей отклоняет сама БД."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('user')
+        cls.author = make_user('author')
+        cls.tag, = make_tags(1)
+        cls.ingredient, = make_ingredients(1)
+        cls.recipe = make_recipe(cls.author, tags=[cls.tag],
+                                 ingredients=[cls.ingredient])
+
+    def assert_duplicate_rejected(self, create):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            create()
+
+    def test_tag_recipe(self):
+        self.assert_duplicate_rejected(lambda: TagRecipe.objects.create(
+            recipe=self.recipe, tag=self.tag))
+
+    def test_ingredient_recipe(self):
+        self.assert_duplicate_rejected(
+            lambda: IngredientRecipe.objects.create(
+                recipe=self.recipe, ingredient=self.ingredient, amount=1))
+
+    def test_ingredient(self):
+        self.assert_duplicate_rejected(lambda: Ingredient.objects.create(
+            name=self.ingredient.name,
+            measurement_unit=self.ingredient.measurement_unit))
+
+    def test_tag_slug(self):
+        self.assert_duplicate_rejected(lambda: Tag.objects.create(
+            name='Другой', slug=self.tag.slug))
+
+    def test_user_recipe_lists(self):
+        for flag in ('is_favorited', 'is_in_shopping_cart'):
+            with self.subTest(flag=flag):
+                UserRecipeLists.objects.create(
+                    recipe=self.recipe, user=self.user, **{flag: True})
+                self.assert_duplicate_rejected(
+                    lambda: UserRecipeLists.objects.create(
+                        recipe=self.recipe, user=self.user,
+                        **{flag: True}))
+
+    def test_user_subscription(self):
+        UserSubscription.objects.create(person_id=self.user,
+                                        sub_id=self.author)
+        self.assert_duplicate_rejected(
+            lambda: UserSubscription.objects.create(person_id=self.user,
+                                                    sub_id=self.author))
+
+
+class DuplicateIdsValidationTest(TempMediaMixin, CacheTestCase):
+    """RecipeSerializer отклоняет повторы до записи в БД."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.tags = make_tags(2)
+        cls.ingredients = make_ingredients(2)
+
+    def post(self, tags, ingredients):
+        return client_for(self.author).post('/api/recipes/', {
+            'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 5,
+            'image': image_data(), 'tags': tags,
+            'ingredients': [{'id': pk, 'amount': 1} for pk in ingredients],
+        }, format='json')
+
+    def test_duplicate_tags(self):
+        tag = self.tags[0].id
+        response = self.post([tag, tag], [self.ingredients[0].id])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tags', response.data)
+
+    def test_duplicate_ingredients(self):
+        ingredient = self.ingredients[0].id
+        response = self.post([self.tags[0].id], [ingredient, ingredient])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.data)
+
+    def test_distinct_ids_accepted(self):
+        response = self.post([tag.id for tag in self.tags],
+                             [item.id for item in self.ingredients])
+        self.assertEqual(response.status_code, 201)
@@ -0,0 +1,106 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from recipes.counters import change_counter
+from recipes.models import Recipe, ShoppingList, UserRecipeLists
+from recipes.tests.utils import (CacheTestCase, TempMediaMixin, client_for,
+                                 image_data, make_ingredients, make_recipe,
+                                 make_user)
+from user.models import User
+
+
+class CountersSurviveSaveTest(TempMediaMixin, CacheTestCase):
+    """Сохранение загруженного раньше экземпляра не откатывает счётчики."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('user')
+        cls.recipe = make_recipe(cls.user)
+
+    def setUp(self):
+        super().setUp()
+        self.client = client_for(self.user)
+        # Первый запрос кладёт снимок пользователя в кэш токенов.
+        self.client.get('/api/users/me/')
+        change_counter(User, self.user.id, 'subscribers_count', 5)
+        change_counter(Recipe, self.recipe.id, 'favorites_count', 3)
+
+    def assert_counters_kept(self):
+        self.assertEqual(User.objects.get(pk=self.user.id).subscribers_count,
+                         5)
+        self.assertEqual(
+            Recipe.objects.get(pk=self.recipe.id).favorites_count, 3)
+
+    def test_model_save(self):
+        self.user.first_name = 'Другое'
+        self.user.save()
+        self.recipe.name = 'Другое'
+        self.recipe.save()
+        self.assert_counters_kept()
+        self.assertEqual(User.objects.get(pk=self.user.id).first_name,
+                         'Другое')
+
+    def test_avatar(self):
+        response = self.client.put('/api/users/me/avatar/',
+                                   {'avatar': image_data()}, format='json')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.delete('/api/users/me/avatar/')
+        self.assertEqual(response.status_code, 204)
+        self.assert_counters_kept()
+
+    def test_set_password(self):
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'Pass-12345',
+            'new_password': 'Other-Pass-678'}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assert_counters_kept()
+
+    def test_recipe_update(self):
+        response = self.client.patch(
+            f'/api/recipes/{self.recipe.id}/', {'cooking_time': 5},
+            format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assert_counters_kept()
+
+
+class RecountCommandTest(CacheTestCase):
+    """recount чинит разошедшиеся счётчики и списки покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('user')
+        cls.other = make_user('other')
+        ingredients = make_ingredients(3)
+        cls.recipes = [make_recipe(cls.user, ingredients=ingredients[:2]),
+                       make_recipe(cls.user, ingredients=ingredients[1:],
+                                   amount=5)]
+        UserRecipeLists.objects.bulk_create(
+            UserRecipeLists(user=cls.user, recipe=recipe,
+                            is_favorited=True, is_in_shopping_cart=True)
+            for recipe in cls.recipes)
+        cls.ingredients = ingredients
+
+    def shopping_list(self, user):
+        return dict(ShoppingList.objects.filter(user=user).values_list(
+            'ingredient', 'amount'))
+
+    def test_recount(self):
+        # bulk_create не шлёт сигналов: счётчики и список пусты,
+        # у второго пользователя лишний список без корзины.
+        ShoppingList.objects.create(user=self.other,
+                                    ingredient=self.ingredients[0], amount=7)
+        change_counter(User, self.other.id, 'recipes_count', 4)
+        out = StringIO()
+        call_command('recount', stdout=out)
+        self.assertIn('Rebuilt 2 shopping lists', out.getvalue())
+        self.assertEqual(self.shopping_list(self.user), {
+            self.ingredients[0].id: 10, self.ingredients[1].id: 15,
+            self.ingredients[2].id: 5})
+        self.assertEqual(self.shopping_list(self.other), {})
+        self.assertEqual(
+            list(Recipe.objects.order_by('id').values_list(
+                'favorites_count', 'shopping_cart_count')), [(1, 1), (1, 1)])
+        self.assertEqual(
+            list(User.objects.order_by('id').values_list('recipes_count',
+                                                         flat=True)), [2, 0])
@@ -0,0 +1,87 @@
+from django.test import override_settings
+
+from recipes.models import FeedItem
+from recipes.tests.utils import (CacheTestCase, client_for, cursor,
+                                 make_recipe, make_user)
+from user.models import UserSubscription
+
+
+class FeedTest(CacheTestCase):
+    """Лента: раскладка, подтягивание при подписке, чистка и курсор."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = make_user('reader')
+        cls.author = make_user('author')
+        cls.other = make_user('other')
+
+    def setUp(self):
+        super().setUp()
+        self.client = client_for(self.reader)
+
+    def subscribe(self, author):
+        UserSubscription.objects.create(person_id=self.reader, sub_id=author)
+
+    def feed_ids(self, url='/api/recipes/feed/'):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_fan_out(self):
+        self.subscribe(self.author)
+        recipe = make_recipe(self.author)
+        make_recipe(self.other)
+        self.assertEqual(list(FeedItem.objects.values_list(
+            'user', 'recipe')), [(self.reader.id, recipe.id)])
+        self.assertEqual(self.feed_ids(), [recipe.id])
+
+    @override_settings(FEED_BACKFILL=2)
+    def test_backfill_newest(self):
+        recipes = [make_recipe(self.author) for _ in range(3)]
+        self.assertEqual(self.feed_ids(), [])
+        self.subscribe(self.author)
+        self.assertEqual(self.feed_ids(),
+                         [recipes[2].id, recipes[1].id])
+
+    def test_prune(self):
+        make_recipe(self.author)
+        self.subscribe(self.author)
+        self.subscribe(self.other)
+        recipe = make_recipe(self.other)
+        UserSubscription.objects.get(person_id=self.reader,
+                                     sub_id=self.author).delete()
+        self.assertEqual(self.feed_ids(), [recipe.id])
+        self.assertFalse(FeedItem.objects.filter(author=self.author).exists())
+
+    @override_settings(FEED_FANOUT_LIMIT=0)
+    def test_pull_without_fan_out(self):
+        self.subscribe(self.author)
+        recipe = make_recipe(self.author)
+        self.assertFalse(FeedItem.objects.exists())
+        # Курсорные страницы ленту не пополняют, первая — пополняет.
+        self.assertEqual(self.feed_ids(
+            f'/api/recipes/feed/?cursor={cursor([recipe.id + 1])}'), [])
+        self.assertEqual(self.feed_ids(), [recipe.id])
+
+    def test_cursor_pages(self):
+        self.subscribe(self.author)
+        expected = [make_recipe(self.author).id for _ in range(8)][::-1]
+        ids, url = [], '/api/recipes/feed/?limit=3'
+        while url:
+            response = self.client.get(url)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+            last = response.data
+        self.assertEqual(ids, expected)
+        response = self.client.get(last['previous'])
+        self.assertEqual([recipe['id'] for recipe in response.data['results']],
+                         expected[3:6])
+
+    def test_malformed_cursor(self):
+        self.subscribe(self.author)
+        make_recipe(self.author)
+        for position in ([{'a': 1}], ['x'], [None], [1, 2]):
+            with self.subTest(position=position):
+                response = self.client.get(
+                    f'/api/recipes/feed/?cursor={cursor(position)}')
+                self.assertEqual(response.status_code, 404)
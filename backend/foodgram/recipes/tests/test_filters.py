@@ -0,0 +1,80 @@
+from itertools import product
+
+from django.http import QueryDict
+
+from recipes.mixins import recipe_filter
+from recipes.models import Recipe, UserRecipeLists
+from recipes.tests.utils import (CacheTestCase, make_recipe, make_tags,
+                                 make_user)
+
+
+def legacy_filter(query_params, user):
+    """Прежний FilterModelMixin.get_queryset: четыре цепочки id__in."""
+    queryset = Recipe.objects.all()
+    author = query_params.getlist('author')
+    queryset_author = (Recipe.objects.filter(author__in=author) if author
+                       else queryset)
+    tags = query_params.getlist('tags')
+    queryset_tag = (Recipe.objects.filter(tags__slug__in=tags) if tags
+                    else queryset)
+    querysets = []
+    for field in ('is_in_shopping_cart', 'is_favorited'):
+        value = query_params.get(field)
+        listed = user.recipes_list.filter(**{field: True}).values('recipe')
+        if value == '1':
+            querysets.append(listed)
+        elif value == '0':
+            querysets.append(queryset.exclude(id__in=listed))
+        else:
+            querysets.append(queryset)
+    return (queryset.filter(id__in=querysets[0])
+            .filter(id__in=querysets[1])
+            .filter(id__in=queryset_tag)
+            .filter(id__in=queryset_author))
+
+
+class RecipeFilterEquivalenceTest(CacheTestCase):
+    """recipe_filter отбирает те же рецепты, что и прежняя реализация."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = make_user('viewer')
+        cls.other = make_user('other')
+        cls.authors = [make_user(f'author{number}') for number in range(3)]
+        cls.tags = make_tags(3)
+        recipes = [
+            make_recipe(cls.authors[number % 3],
+                        tags=cls.tags[number % 3:number % 3 + number % 2 + 1])
+            for number in range(12)]
+        for number, recipe in enumerate(recipes):
+            if number % 3 != 2:
+                UserRecipeLists.objects.create(
+                    user=cls.viewer, recipe=recipe,
+                    is_favorited=number % 2 == 0,
+                    is_in_shopping_cart=number % 3 == 0)
+            if number % 4 == 0:
+                UserRecipeLists.objects.create(
+                    user=cls.other, recipe=recipe, is_favorited=True,
+                    is_in_shopping_cart=True)
+
+    def test_all_combinations(self):
+        authors = ('', f'author={self.authors[0].id}',
+                   f'author={self.authors[0].id}'
+                   f'&author={self.authors[1].id}')
+        tags = ('', f'tags={self.tags[0].slug}',
+                f'tags={self.tags[0].slug}&tags={self.tags[1].slug}')
+        flags = ('', '0', '1')
+        for author, tag, favorited, cart in product(authors, tags, flags,
+                                                    flags):
+            params = '&'.join(part for part in (
+                author, tag,
+                favorited and f'is_favorited={favorited}',
+                cart and f'is_in_shopping_cart={cart}') if part)
+            with self.subTest(params=params):
+                query_params = QueryDict(params)
+                expected = legacy_filter(query_params, self.viewer)
+                actual = Recipe.objects.filter(
+                    *recipe_filter(query_params, self.viewer))
+                self.assertEqual(
+                    sorted(actual.values_list('id', flat=True)),
+                    sorted(set(expected.values_list('id', flat=True))))
@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+
+from recipes.fragments import (fragment_key, get_fragments, hit_rate,
+                               set_fragments)
+from recipes.models import IngredientRecipe, Recipe, TagRecipe
+from recipes.tests.utils import (CacheTestCase, client_for, make_ingredients,
+                                 make_recipe, make_tags, make_user)
+
+DUMMY_CACHE = {'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+
+
+class FragmentCacheTest(CacheTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.tags = make_tags(2)
+        cls.ingredients = make_ingredients(2)
+        cls.recipe = make_recipe(cls.author, 'Суп', cls.tags[:1],
+                                 cls.ingredients)
+        cls.other = make_recipe(make_user('other'), 'Каша')
+
+    def keys(self):
+        recipes = Recipe.objects.filter(pk__in=(self.recipe.pk,
+                                                self.other.pk))
+        keys, _ = get_fragments(recipes)
+        return keys
+
+    def assert_touched(self, change, touched=True):
+        before = self.keys()
+        change()
+        after = self.keys()
+        self.assertEqual(before[self.recipe.id] != after[self.recipe.id],
+                         touched)
+        # Запись в один рецепт не сбрасывает фрагменты остальных.
+        self.assertEqual(before[self.other.id], after[self.other.id])
+
+    def test_recipe_version_changes_fragment_key(self):
+        # Версия из БД меняет ключ, даже если кэш другого процесса
+        # ничего не знает об изменении.
+        keys, _ = get_fragments([self.recipe])
+        set_fragments({keys[self.recipe.id]: {'name': 'устаревший'}})
+        _, fragments = get_fragments([self.recipe])
+        self.assertIn(self.recipe.id, fragments)
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        recipe.save()
+        new_keys, fragments = get_fragments([recipe])
+        self.assertNotEqual(keys, new_keys)
+        self.assertEqual(fragments, {})
+
+    def test_relations_change_version(self):
+        changes = (
+            lambda: TagRecipe.objects.create(recipe=self.recipe,
+                                             tag=self.tags[1]),
+            lambda: IngredientRecipe.objects.filter(
+                recipe=self.recipe).first().delete(),
+            lambda: self.tags[0].save(),
+            lambda: self.ingredients[1].save(),
+        )
+        for number, change in enumerate(changes):
+            with self.subTest(number=number):
+                self.assert_touched(change)
+
+    def test_author_profile_changes_version(self):
+        author = Recipe.objects.get(pk=self.recipe.pk).author
+        author.first_name = 'Другое'
+        self.assert_touched(author.save)
+        self.assert_touched(lambda: author.save(update_fields=['last_name']))
+        # Вход и смена пароля фрагмент не меняют.
+        self.assert_touched(lambda: author.save(update_fields=['last_login']),
+                            touched=False)
+        self.assert_touched(lambda: author.save(update_fields=['password']),
+                            touched=False)
+
+    def test_changed_recipe_is_served_fresh(self):
+        client = client_for()
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.assertEqual(client.get(url).data['name'], 'Суп')
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        recipe.name = 'Борщ'
+        recipe.save()
+        self.assertEqual(client.get(url).data['name'], 'Борщ')
+
+    def test_update_response_has_new_tags(self):
+        client = client_for(self.author)
+        url = f'/api/recipes/{self.recipe.id}/'
+        client.get(url)
+        response = client.patch(url, {'tags': [self.tags[1].id]},
+                                format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([tag['id'] for tag in response.data['tags']],
+                         [self.tags[1].id])
+        self.assertEqual([tag['id'] for tag in client.get(url).data['tags']],
+                         [self.tags[1].id])
+
+    def count_lookups(self):
+        hits, misses, _ = hit_rate()
+        get_fragments([self.recipe])
+        set_fragments({fragment_key(self.recipe): {}})
+        get_fragments([self.recipe])
+        new_hits, new_misses, _ = hit_rate()
+        return new_hits - hits, new_misses - misses
+
+    def test_stats_without_shared_cache(self):
+        # Счётчики пишутся в БД: LocMem у каждого процесса свой.
+        self.assertEqual(self.count_lookups(), (1, 1))
+        out = StringIO()
+        call_command('recipe_cache_stats', stdout=out)
+        self.assertIn('Hits: ', out.getvalue())
+
+    @override_settings(CACHES=DUMMY_CACHE)
+    def test_stats_with_dummy_cache(self):
+        self.assertEqual(self.count_lookups(), (0, 2))
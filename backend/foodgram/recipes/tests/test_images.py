@@ -0,0 +1,121 @@
+import os
+import struct
+from io import BytesIO
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase
+from PIL import Image, ImageCms, PngImagePlugin
+
+from recipes.images import ORIENTATION, strip_metadata
+
+from recipes.signals import build_variants
+from recipes.tests.utils import (CacheTestCase, TempMediaMixin, client_for,
+                                 image_data, make_ingredients, make_tags,
+                                 make_user)
+
+
+class ImageVariantsTest(TempMediaMixin, CacheTestCase):
+    """Адреса копий появляются в ответах только вместе с файлами."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = make_user('author')
+        cls.tags = make_tags(1)
+        cls.ingredients = make_ingredients(1)
+
+    def variants(self, client):
+        recipe, = client.get('/api/recipes/').data['results']
+        return recipe['image'], recipe['image_variants']
+
+    def test_original_until_variants_exist(self):
+        client = client_for(self.author)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = client.post('/api/recipes/', {
+                'name': 'Рецепт', 'text': 'Описание', 'cooking_time': 5,
+                'image': image_data(), 'tags': [self.tags[0].id],
+                'ingredients': [{'id': self.ingredients[0].id,
+                                 'amount': 1}],
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
+        builds = [callback for callback in callbacks
+                  if getattr(callback, 'func', None) is build_variants]
+        self.assertEqual(len(builds), 1)
+        for callback in callbacks:
+            if callback not in builds:
+                callback()
+        image, variants = self.variants(client)
+        self.assertEqual({url for formats in variants.values()
+                          for url in formats.values()}, {image})
+        # Копии строятся после коммита и меняют версию рецептов, так что
+        # закэшированный фрагмент с оригиналом больше не читается.
+        builds[0]()
+        image, variants = self.variants(client)
+        self.assertEqual(variants['card']['webp'].rsplit('.', 1)[1], 'webp')
+        self.assertNotIn(image, {url for formats in variants.values()
+                                 for url in formats.values()})
+        for formats in variants.values():
+            for url in formats.values():
+                name = urlparse(url).path.removeprefix(settings.MEDIA_URL)
+                self.assertTrue(default_storage.exists(name), name)
+
+
+class StripMetadataTest(SimpleTestCase):
+    """Метаданные вырезаются без перекодирования, ICC остаётся."""
+
+    def setUp(self):
+        self.image = Image.frombytes('RGB', (120, 90),
+                                     os.urandom(120 * 90 * 3))
+        self.icc = ImageCms.ImageCmsProfile(
+            ImageCms.createProfile('sRGB')).tobytes()
+        exif = Image.Exif()
+        exif[ORIENTATION] = 6
+        exif[0x010F] = 'Камера'
+        self.exif = exif.tobytes()
+
+    def original(self, image_format, **options):
+        buffer = BytesIO()
+        self.image.save(buffer, image_format, icc_profile=self.icc,
+                        exif=self.exif, **options)
+        return buffer.getvalue()
+
+    def strip(self, data):
+        return strip_metadata(ContentFile(data, name='image')).read()
+
+    def assert_stripped(self, original, cleaned):
+        with Image.open(BytesIO(original)) as before, \
+                Image.open(BytesIO(cleaned)) as after:
+            self.assertEqual(dict(after.getexif()), {ORIENTATION: 6})
+            self.assertEqual(after.info.get('icc_profile'), self.icc)
+            self.assertEqual(after.tobytes(), before.tobytes())
+        self.assertNotIn('Камера'.encode(), cleaned)
+        self.assertNotIn(b'http://ns.adobe.com/xap/1.0/', cleaned)
+        self.assertLessEqual(len(cleaned), len(original))
+        self.assertGreater(len(cleaned), len(original) * 0.95)
+
+    def test_jpeg(self):
+        original = self.original('JPEG', quality=95, subsampling=0)
+        xmp = b'http://ns.adobe.com/xap/1.0/\0<x:xmpmeta/>'
+        # XMP идёт отдельным сегментом APP1 сразу после SOI.
+        original = (original[:2] + b'\xff\xe1'
+                    + struct.pack('>H', len(xmp) + 2) + xmp + original[2:])
+        cleaned = self.strip(original)
+        self.assert_stripped(original, cleaned)
+        with Image.open(BytesIO(original)) as before, \
+                Image.open(BytesIO(cleaned)) as after:
+            self.assertEqual(after.quantization, before.quantization)
+            self.assertEqual(after.layer, before.layer)
+
+    def test_png(self):
+        text = PngImagePlugin.PngInfo()
+        text.add_text('Author', 'Камера')
+        text.add_itxt('XML:com.adobe.xmp', 'http://ns.adobe.com/xap/1.0/')
+        original = self.original('PNG', pnginfo=text)
+        self.assert_stripped(original, self.strip(original))
+
+    def test_webp(self):
+        original = self.original('WEBP', lossless=True,
+                                 xmp=b'http://ns.adobe.com/xap/1.0/')
+        self.assert_stripped(original, self.strip(original))
@@ -0,0 +1,74 @@
+import re
+from unittest import skipUnless
+
+from django.db import connection
+from django.http import QueryDict
+
+from recipes.mixins import recipe_filter
+from recipes.models import Recipe
+from recipes.shopping_list import cart_totals
+from recipes.tests.utils import CacheTestCase, make_user
+
+# Таблицы связей, которые не должны читаться целиком.
+JOIN_TABLES = ('recipes_userrecipelists', 'recipes_tagrecipe',
+               'recipes_ingredientrecipe', 'recipes_tag')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Планы EXPLAIN QUERY PLAN SQLite')
+class QueryPlanTest(CacheTestCase):
+    """Фильтры списка рецептов и суммы корзины идут по индексам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('user')
+
+    def plan(self, queryset):
+        sql = str(queryset.query)
+        plan = queryset.explain()
+        # В плане SQLite подзапросы называют таблицы псевдонимами U0, U1...
+        aliases = dict(re.findall(r'"(\w+)" (U\d+)', sql))
+        for table, alias in list(aliases.items()):
+            plan = re.sub(rf'\b{alias}\b', table, plan)
+        return plan
+
+    def assert_indexed(self, queryset, *indexes):
+        plan = self.plan(queryset)
+        for table in JOIN_TABLES:
+            self.assertNotRegex(plan, rf'\bSCAN {table}\b', plan)
+        for index in indexes:
+            self.assertRegex(plan, index, plan)
+
+    def recipes(self, params):
+        return Recipe.objects.filter(
+            *recipe_filter(QueryDict(params), self.user))
+
+    def test_user_list_filters(self):
+        for field, index in (('is_favorited', 'unique_user_favorite'),
+                             ('is_in_shopping_cart',
+                              'unique_user_shopping_cart')):
+            for value in ('0', '1'):
+                with self.subTest(field=field, value=value):
+                    self.assert_indexed(self.recipes(f'{field}={value}'),
+                                        rf'SEARCH recipes_userrecipelists '
+                                        rf'USING INDEX {index}')
+
+    def test_tags_filter(self):
+        # UniqueConstraint в SQLite становится автоиндексом таблицы.
+        self.assert_indexed(
+            self.recipes('tags=breakfast&tags=dinner'),
+            r'SEARCH recipes_tagrecipe USING (COVERING )?INDEX '
+            r'(unique_recipe_tag|sqlite_autoindex_recipes_tagrecipe_\d)',
+            r'SEARCH recipes_tag USING (COVERING )?INDEX')
+
+    def test_all_filters(self):
+        self.assert_indexed(self.recipes(
+            f'author={self.user.id}&tags=breakfast&is_favorited=1'
+            f'&is_in_shopping_cart=0'), 'unique_user_favorite',
+            'unique_user_shopping_cart')
+
+    def test_cart_totals(self):
+        self.assert_indexed(
+            cart_totals([self.user.id]),
+            r'SEARCH recipes_userrecipelists USING INDEX '
+            r'unique_user_shopping_cart',
+            r'SEARCH recipes_ingredientrecipe USING INDEX')
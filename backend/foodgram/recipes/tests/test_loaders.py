@@ -0,0 +1,32 @@
+import json
+import shutil
+import tempfile
+from pathlib import Path
+
+from recipes.loaders import load_ingredients
+from recipes.models import Ingredient
+from recipes.tests.utils import CacheTestCase
+
+
+class LoadIngredientsTest(CacheTestCase):
+    """Повторная загрузка не создаёт дублей и не падает на конфликте."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = Path(directory) / 'ingredients.json'
+        self.path.write_text(json.dumps([
+            {'name': 'Соль', 'measurement_unit': 'г'},
+            {'name': 'Соль', 'measurement_unit': 'щепотка'},
+            {'name': ' Соль ', 'measurement_unit': 'г'},
+            {'name': 'Вода', 'measurement_unit': 'мл'},
+        ], ensure_ascii=False), encoding='utf-8')
+
+    def test_idempotent(self):
+        Ingredient.objects.create(name='Вода', measurement_unit='мл')
+        self.assertEqual(load_ingredients([self.path], batch_size=2).new, 2)
+        self.assertEqual(load_ingredients([self.path], batch_size=2).new, 0)
+        self.assertEqual(sorted(Ingredient.objects.values_list(
+            'name', 'measurement_unit')), [
+            ('Вода', 'мл'), ('Соль', 'г'), ('Соль', 'щепотка')])
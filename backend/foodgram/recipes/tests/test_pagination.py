@@ -0,0 +1,54 @@
+from recipes.tests.utils import (CacheTestCase, client_for, cursor,
+                                 make_recipe, make_user)
+
+
+class RecipeCursorPaginationTest(CacheTestCase):
+    """Курсор по (name, id) не теряет и не повторяет рецепты."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = make_user('author')
+        # Одинаковые названия попадают на границы страниц.
+        cls.recipes = [make_recipe(author, name=f'Рецепт {number % 3}')
+                       for number in range(14)]
+        cls.expected = [recipe.id for recipe in sorted(
+            cls.recipes, key=lambda recipe: (recipe.name, recipe.id))]
+
+    def walk(self, url, link):
+        ids, pages = [], []
+        client = client_for()
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data[link]
+        return ids, pages
+
+    def test_forward(self):
+        ids, pages = self.walk('/api/recipes/?cursor=&limit=4', 'next')
+        self.assertEqual(ids, self.expected)
+        self.assertEqual([len(page['results']) for page in pages],
+                         [4, 4, 4, 2])
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_backward(self):
+        _, pages = self.walk('/api/recipes/?cursor=&limit=4', 'next')
+        ids, back = self.walk(pages[-1]['previous'], 'previous')
+        self.assertEqual(ids, [
+            recipe_id for page in (2, 1, 0)
+            for recipe_id in self.expected[page * 4:page * 4 + 4]])
+        self.assertTrue(all(page['next'] for page in back))
+
+    def test_invalid_cursor(self):
+        response = client_for().get('/api/recipes/?cursor=garbage')
+        self.assertEqual(response.status_code, 404)
+
+    def test_malformed_cursor_values(self):
+        client = client_for()
+        for position in (['x', {'a': 1}], [['x'], 1], ['x', 'y'],
+                         ['x', None], ['x', True], ['x', 2 ** 70]):
+            with self.subTest(position=position):
+                response = client.get(
+                    f'/api/recipes/?cursor={cursor(position)}')
+                self.assertEqual(response.status_code, 404)
@@ -0,0 +1,48 @@
+from io import BytesIO
+from unittest import skipIf
+
+from django.test import SimpleTestCase
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+from recipes.pdf import (SHOPPING_LIST_TEMPLATE, ShoppingListPDF,
+                         shopping_list_line)
+
+
+@skipIf(PdfReader is None, 'pypdf ставится из requirements-dev.txt')
+class ShoppingListPDFTest(SimpleTestCase):
+    """Собранный вручную PDF читается обычной библиотекой."""
+
+    def setUp(self):
+        self.ingredients = [
+            {'name': ' '.join([f'Ингредиент {number}']
+                              + ['очень длинное название'] * (number % 4)),
+             'measurement_unit': 'г', 'amount': number}
+            for number in range(120)]
+
+    def read(self, ingredients):
+        return PdfReader(BytesIO(b''.join(ShoppingListPDF(ingredients))),
+                         strict=True)
+
+    def test_multi_page(self):
+        template = SHOPPING_LIST_TEMPLATE
+        rows = [template.header, ''] + [
+            row for ingredient in self.ingredients
+            for row in template.wrap(shopping_list_line(ingredient))]
+        reader = self.read(self.ingredients)
+        self.assertEqual(len(reader.pages),
+                         -(-len(rows) // template.lines_per_page))
+        self.assertGreater(len(reader.pages), 1)
+        text = [line.rstrip() for page in reader.pages
+                for line in page.extract_text().split('\n')]
+        self.assertEqual([line for line in text if line],
+                         [row for row in rows if row])
+
+    def test_empty(self):
+        reader = self.read([])
+        self.assertEqual(len(reader.pages), 1)
+        self.assertEqual(reader.pages[0].extract_text().strip(),
+                         SHOPPING_LIST_TEMPLATE.header)
@@ -0,0 +1,90 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.test import override_settings
+
+from recipes import pdf_jobs
+from recipes.models import UserRecipeLists
+from recipes.tests.utils import (CacheTestCase, client_for, make_ingredients,
+                                 make_recipe, make_user)
+
+WAIT_TIMEOUT = 30
+
+
+class ShoppingCartJobTest(CacheTestCase):
+    """Фоновый PDF: метки «в работе» и доступ только владельцу."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = make_user('owner')
+        cls.stranger = make_user('stranger')
+        recipe = make_recipe(cls.owner, ingredients=make_ingredients(3))
+        UserRecipeLists.objects.create(user=cls.owner, recipe=recipe,
+                                       is_in_shopping_cart=True)
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        jobs_settings = override_settings(SHOPPING_LIST_PDF_DIR=directory)
+        jobs_settings.enable()
+        self.addCleanup(jobs_settings.disable)
+        self.client = client_for(self.owner)
+
+    def start(self):
+        response = self.client.post('/api/recipes/download_shopping_cart/')
+        self.assertIn(response.status_code, (200, 202))
+        return response.data['id']
+
+    def wait(self, job):
+        deadline = time.monotonic() + WAIT_TIMEOUT
+        while pdf_jobs.job_status(self.owner.id, job) != pdf_jobs.DONE:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.05)
+
+    def test_owner_only(self):
+        job = self.start()
+        self.wait(job)
+        url = f'/api/recipes/download_shopping_cart/{job}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(b''.join(response.streaming_content)
+                        .startswith(b'%PDF'))
+        response = client_for(self.stranger).get(url)
+        self.assertEqual(response.status_code, 404)
+
+    def test_fresh_marker_kept(self):
+        job = self.start()
+        self.wait(job)
+        pdf_jobs.result_path(self.owner.id, job).unlink()
+        marker = pdf_jobs.pending_path(self.owner.id, job)
+        # Метку «занятого» рендера пересоздавать нельзя.
+        marker.write_text('busy')
+        self.assertEqual(self.start(), job)
+        self.assertEqual(marker.read_text(), 'busy')
+        self.assertFalse(pdf_jobs.result_path(self.owner.id, job).exists())
+
+    def test_stale_marker_replaced(self):
+        job = self.start()
+        self.wait(job)
+        pdf_jobs.result_path(self.owner.id, job).unlink()
+        marker = pdf_jobs.pending_path(self.owner.id, job)
+        marker.touch()
+        expired = time.time() - settings.SHOPPING_LIST_PDF_TIMEOUT
+        os.utime(marker, (expired - 1, expired - 1))
+        self.assertEqual(pdf_jobs.job_status(self.owner.id, job),
+                         pdf_jobs.STALE)
+        self.assertEqual(self.start(), job)
+        self.wait(job)
+        self.assertFalse(marker.exists())
+        self.assertEqual(
+            list(pdf_jobs.job_dir(self.owner.id).glob('*.tmp')), [])
+
+    def test_pool_size_shared_by_web_workers(self):
+        for workers, web, size in ((8, 3, 2), (2, 4, 1), (2, 1, 2)):
+            with self.subTest(workers=workers, web=web), override_settings(
+                    SHOPPING_LIST_PDF_WORKERS=workers, WEB_CONCURRENCY=web):
+                self.assertEqual(pdf_jobs.pool_size(), size)
@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.tests.utils import (CacheTestCase, client_for, make_ingredients,
+                                 make_recipe, make_tags, make_user)
+
+PAGE_SIZES = (1, 2, 6)
+
+
+class RecipeListQueriesTest(CacheTestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.viewer = make_user('viewer')
+        authors = [make_user(f'author{number}') for number in range(3)]
+        tags = make_tags(3)
+        ingredients = make_ingredients(5)
+        for number in range(6):
+            make_recipe(authors[number % 3], f'Рецепт {number}',
+                        tags[:number % 3 + 1], ingredients[:number % 5 + 1])
+
+    def count_queries(self, client, limit, warm):
+        url = f'/api/recipes/?limit={limit}'
+        cache.clear()
+        # Первый запрос кладёт токен и фрагменты в кэш.
+        client.get(url if warm else '/api/tags/')
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+        return len(context)
+
+    def assert_constant(self, client):
+        for warm in (False, True):
+            with self.subTest(warm=warm):
+                counts = {self.count_queries(client, limit, warm)
+                          for limit in PAGE_SIZES}
+                self.assertEqual(len(counts), 1, counts)
+
+    def test_anonymous_list(self):
+        self.assert_constant(client_for())
+
+    def test_authenticated_list(self):
+        self.assert_constant(client_for(self.viewer))
+
+    def test_detail(self):
+        client = client_for(self.viewer)
+        recipe_id = client.get('/api/recipes/').data['results'][0]['id']
+        cache.clear()
+        client.get('/api/tags/')
+        with self.assertNumQueries(4):
+            client.get(f'/api/recipes/{recipe_id}/')
@@ -0,0 +1,50 @@
+import json
+
+from recipes.models import Recipe
+from recipes.tests.utils import (CacheTestCase, client_for, make_ingredients,
+                                 make_tags, make_user)
+
+
+class ImportNDJSONTest(CacheTestCase):
+    """Ошибки отдельных строк импорта попадают в отчёт, а не в 500."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('admin', is_staff=True)
+        cls.tag, = make_tags(1)
+        cls.ingredient, = make_ingredients(1)
+
+    def record(self, name):
+        return json.dumps({
+            'name': name, 'text': 'Описание', 'cooking_time': 5,
+            'author': self.admin.username, 'tags': [self.tag.slug],
+            'ingredients': [{
+                'name': self.ingredient.name,
+                'measurement_unit': self.ingredient.measurement_unit,
+                'amount': 3}],
+        }, ensure_ascii=False).encode()
+
+    def post(self, *lines):
+        return client_for(self.admin).generic(
+            'POST', '/api/recipes/import/', b'\n'.join(lines),
+            content_type='application/x-ndjson')
+
+    def test_bad_lines_reported(self):
+        response = self.post(self.record('Первый'),
+                             'Рецепт'.encode('cp1251'),
+                             b'{"name":',
+                             self.record('Второй'))
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['failed'], 2)
+        self.assertEqual([error['line'] for error in response.data['errors']],
+                         [2, 3])
+        self.assertIn('UTF-8', response.data['errors'][0]['errors'])
+        self.assertIn('JSON', response.data['errors'][1]['errors'])
+        self.assertEqual(set(Recipe.objects.values_list('name', flat=True)),
+                         {'Первый', 'Второй'})
+
+    def test_only_bad_lines(self):
+        response = self.post(b'\xff\xfe')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['failed'], 1)
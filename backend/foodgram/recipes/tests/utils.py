@@ -0,0 +1,94 @@
+"""Общие заготовки для тестов."""
+import base64
+import json
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Ingredient, IngredientRecipe, Recipe, Tag,
+                            TagRecipe)
+
+User = get_user_model()
+
+
+def make_user(username, **extra):
+    return User.objects.create_user(
+        email=f'{username}@example.com', username=username,
+        first_name='Имя', last_name='Фамилия', password='Pass-12345',
+        **extra)
+
+
+def client_for(user=None):
+    client = APIClient()
+    if user is not None:
+        token, _ = Token.objects.get_or_create(user=user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def make_tags(count):
+    return [Tag.objects.create(name=f'Тег {number}', slug=f'tag-{number}')
+            for number in range(count)]
+
+
+def make_ingredients(count):
+    return [Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(count)]
+
+
+def make_recipe(author, name='Рецепт', tags=(), ingredients=(), amount=10):
+    recipe = Recipe.objects.create(
+        author=author, name=name, text='Описание', cooking_time=10,
+        image='recipes/images/test.png')
+    TagRecipe.objects.bulk_create(
+        TagRecipe(recipe=recipe, tag=tag) for tag in tags)
+    IngredientRecipe.objects.bulk_create(
+        IngredientRecipe(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient in ingredients)
+    return recipe
+
+
+def cursor(position, reverse=False):
+    """Курсор KeysetPagination с произвольными значениями."""
+    return base64.urlsafe_b64encode(json.dumps(
+        {'p': position, 'r': int(reverse)}).encode()).decode()
+
+
+def image_data(size=(64, 48), color='red'):
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+class TempMediaMixin:
+    """Пишет загруженные файлы во временный каталог."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+
+class CacheTestCase(TestCase):
+    """Тест с пустым кэшем: id рецептов повторяются между тестами."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
@@ -0,0 +1,196 @@
+"""Потоковый импорт и экспорт рецептов в NDJSON.
+
+Одна строка — один рецепт. Связи записываются не id, а переносимыми
+ключами: автор — username, теги — slug, ингредиенты — название
+и единица измерения, изображение — имя файла в хранилище (сам файл
+не переносится). Экспорт читает рецепты пачками по id, импорт
+проверяет и пишет их пачками, каждую в своей транзакции, поэтому
+память не растёт с размером файла.
+"""
+import json
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Prefetch, prefetch_related_objects
+
+from recipes.conditional import bump_version
+from recipes.counters import change_counter
+from recipes.feed import fan_out
+from recipes.models import (Ingredient, IngredientRecipe, Recipe, Tag,
+                            TagRecipe)
+from recipes.serializers import RecipeRecordSerializer
+
+EXPORT_CHUNK = 500
+IMPORT_CHUNK = 500
+MAX_REPORTED_ERRORS = 100
+
+User = get_user_model()
+
+
+def recipe_record(recipe):
+    return {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'image': recipe.image.name,
+        'author': recipe.author.username,
+        'tags': [tag.slug for tag in recipe.tags.all()],
+        'ingredients': [
+            {'name': item.ingredient.name,
+             'measurement_unit': item.ingredient.measurement_unit,
+             'amount': item.amount}
+            for item in recipe.recipe_ingredients.all()],
+    }
+
+
+def export_recipes(chunk_size=EXPORT_CHUNK):
+    """Генератор строк NDJSON (bytes) по всем рецептам."""
+    last_id = 0
+    while True:
+        recipes = list(Recipe.objects.filter(id__gt=last_id)
+                       .select_related('author').order_by('id')[:chunk_size])
+        if not recipes:
+            return
+        prefetch_related_objects(
+            recipes, 'tags',
+            Prefetch('recipe_ingredients',
+                     queryset=IngredientRecipe.objects.select_related(
+                         'ingredient')))
+        for recipe in recipes:
+            yield (json.dumps(recipe_record(recipe), ensure_ascii=False)
+                   + '\n').encode()
+        last_id = recipes[-1].id
+
+
+class ImportReport:
+    def __init__(self):
+        self.lines = 0
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'line': line, 'errors': message})
+
+    def as_dict(self):
+        return {'lines': self.lines, 'created': self.created,
+                'failed': self.failed, 'errors': self.errors}
+
+
+def import_recipes(lines, chunk_size=IMPORT_CHUNK, progress=None):
+    """Импортирует рецепты из итерируемого по строкам источника.
+
+    Строки могут быть str или bytes в UTF-8. Ошибочные строки
+    пропускаются и попадают в отчёт; progress, если задан, вызывается
+    с отчётом после каждой пачки.
+    """
+    report = ImportReport()
+    batch = []
+    for number, line in enumerate(lines, 1):
+        report.lines = number
+        line = line.strip()
+        if line:
+            batch.append((number, line))
+        if len(batch) >= chunk_size:
+            import_batch(batch, report)
+            batch = []
+            if progress:
+                progress(report)
+    if batch:
+        import_batch(batch, report)
+        if progress:
+            progress(report)
+    return report
+
+
+def validate_batch(batch, report):
+    records = []
+    for number, line in batch:
+        try:
+            if isinstance(line, bytes):
+                line = line.decode()
+            data = json.loads(line)
+        except UnicodeDecodeError as error:
+            report.error(number, f'Строка не в UTF-8: {error}')
+            continue
+        except ValueError as error:
+            report.error(number, f'Некорректный JSON: {error}')
+            continue
+        serializer = RecipeRecordSerializer(data=data)
+        if serializer.is_valid():
+            records.append((number, serializer.validated_data))
+        else:
+            report.error(number, serializer.errors)
+    return records
+
+
+def resolve_batch(records, report):
+    """Подставляет id авторов, тегов и ингредиентов тремя запросами."""
+    authors = User.objects.in_bulk(
+        {record['author'] for _, record in records}, field_name='username')
+    tags = Tag.objects.in_bulk(
+        {slug for _, record in records for slug in record['tags']},
+        field_name='slug')
+    ingredients = {}
+    for pk, name, unit in Ingredient.objects.filter(name__in={
+            item['name'] for _, record in records
+            for item in record['ingredients']}).order_by('id').values_list(
+                'id', 'name', 'measurement_unit'):
+        ingredients.setdefault((name, unit), pk)
+    resolved = []
+    for number, record in records:
+        missing = ([] if record['author'] in authors
+                   else [f'автор {record["author"]}'])
+        missing += [f'тег {slug}' for slug in record['tags']
+                    if slug not in tags]
+        missing += [f'ингредиент {item["name"]} ({item["measurement_unit"]})'
+                    for item in record['ingredients']
+                    if (item['name'], item['measurement_unit'])
+                    not in ingredients]
+        if missing:
+            report.error(number, 'Не найдены: ' + ', '.join(missing))
+            continue
+        resolved.append((
+            Recipe(name=record['name'], text=record['text'],
+                   cooking_time=record['cooking_time'],
+                   image=record['image'],
+                   author_id=authors[record['author']].id),
+            [tags[slug].id for slug in record['tags']],
+            {ingredients[item['name'], item['measurement_unit']]:
+             item['amount'] for item in record['ingredients']}))
+    return resolved
+
+
+def create_recipes(recipes):
+    if connection.features.can_return_rows_from_bulk_insert:
+        Recipe.objects.bulk_create(recipes)
+        authors = Counter(recipe.author_id for recipe in recipes)
+        for author_id, count in authors.items():
+            change_counter(User, author_id, 'recipes_count', count)
+        fan_out(recipes)
+    else:
+        # Без RETURNING id новых строк не узнать: сохраняем по одной,
+        # счётчики тогда обновят сигналы.
+        for recipe in recipes:
+            recipe.save()
+
+
+def import_batch(batch, report):
+    resolved = resolve_batch(validate_batch(batch, report), report)
+    if not resolved:
+        return
+    with transaction.atomic():
+        create_recipes([recipe for recipe, _, _ in resolved])
+        TagRecipe.objects.bulk_create(
+            TagRecipe(recipe=recipe, tag_id=tag_id)
+            for recipe, tag_ids, _ in resolved for tag_id in tag_ids)
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                             amount=amount)
+            for recipe, _, amounts in resolved
+            for ingredient_id, amount in amounts.items())
+        bump_version('recipe')
+    report.created += len(resolved)
@@ -1,37 +1,61 @@
-import io
-from os import path
+from itertools import chain
 
-from django.db.models import F, Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.http import FileResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import NoReverseMatch
 from django_url_shortener.utils import shorten_url
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import inch
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import filters, mixins, status
 from rest_framework.decorators import action
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
 from rest_framework.viewsets import GenericViewSet, ModelViewSet
 
+from recipes import pdf_jobs
+from recipes.conditional import ConditionalGetMixin
+from recipes.feed import pull
+from recipes.fieldsets import model_fields, requested_fields
 from recipes.mixins import FilterModelMixin
-from recipes.models import (Ingredient, Recipe, Tag, UserRecipeLists)
+from recipes.models import Ingredient, Recipe, Tag, UserRecipeLists
+from recipes.pagination import FeedPagination
+from recipes.pdf import ShoppingListPDF, server_timing
 from recipes.permissions import IsAuthorOrAdminOrReadOnly
+from recipes.renderers import (CSVRenderer, NDJSONRenderer, PDFRenderer,
+                               PlainTextRenderer)
+from recipes.search import get_index
 from recipes.serializers import (DownloadShoppingCartSerializer,
                                  FavoriteRecipeSerializer,
                                  IngredientsSerializer, RecipeListSerializer,
-                                 RecipeSerializer, TagsSerializer)
+                                 RecipeSerializer, ShoppingListSerializer,
+                                 TagsSerializer)
+from recipes.shopping_list import (shopping_list_csv, shopping_list_json,
+                                   shopping_list_text)
+from recipes.transfer import export_recipes, import_recipes
+from user.models import UserSubscription
 
-TEXT_ORIGIN_SIZE = 10.8
-FONT_SIZE = 16
+RECIPE_COLUMNS = {
+    'text': ('text', ),
+    'image': ('image', ),
+    'image_variants': ('image', ),
+}
+DEFERRABLE_COLUMNS = {'text', 'image'}
+READ_ACTIONS = ('list', 'retrieve', 'feed')
+SHOPPING_LIST_FORMATS = {
+    'pdf': ShoppingListPDF,
+    'json': shopping_list_json,
+    'txt': shopping_list_text,
+    'csv': shopping_list_csv,
+}
 
 
-class IngredientsViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
-                         GenericViewSet):
+class IngredientsViewSet(ConditionalGetMixin, mixins.ListModelMixin,
+                         mixins.RetrieveModelMixin, GenericViewSet):
+    version_tables = ('ingredient', )
     queryset = Ingredient.objects.all()
     serializer_class = IngredientsSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
@@ -39,20 +63,89 @@ class IngredientsViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
     search_fields = ('name',)
     pagination_class = None
 
+    def get_limit(self):
+        try:
+            limit = int(self.request.query_params.get('limit'))
+        except (TypeError, ValueError):
+            return None
+        return limit if limit > 0 else None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_get(self.search, request, *args, **kwargs)
+
+    def search(self, request, *args, **kwargs):
+        name = request.query_params.get(api_settings.SEARCH_PARAM)
+        index = get_index() if name else None
+        if index is not None:
+            return Response(index.search(name, self.get_limit()))
+        response = mixins.ListModelMixin.list(self, request, *args, **kwargs)
+        response.data = response.data[:self.get_limit()]
+        return response
 
-class TagsViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin,
-                  GenericViewSet):
+
+class TagsViewSet(ConditionalGetMixin, mixins.ListModelMixin,
+                  mixins.RetrieveModelMixin, GenericViewSet):
+    version_tables = ('tag', )
     queryset = Tag.objects.all()
     serializer_class = TagsSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     pagination_class = None
 
 
-class RecipeViewSet(ModelViewSet, FilterModelMixin):
+class RecipeViewSet(ConditionalGetMixin, ModelViewSet, FilterModelMixin):
+    version_tables = ('recipe', 'tag', 'ingredient', 'user',
+                      'userrecipelists', 'usersubscription')
+    per_user = True
+    cursor_ordering = ('name', 'id')
     serializer_class = RecipeSerializer
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
     http_method_names = ('get', 'post', 'patch', 'delete')
 
+    def get_fieldset(self):
+        fields = RecipeListSerializer.Meta.fields
+        if self.action not in READ_ACTIONS:
+            return fields
+        return requested_fields(self.request, fields)
+
+    def get_user_list_fields(self):
+        return [name for name in super().get_user_list_fields()
+                if name in self.get_fieldset()]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in READ_ACTIONS:
+            return queryset
+        if self.action == 'feed':
+            queryset = queryset.filter(
+                feed_items__user=self.request.user).annotate(
+                    feed_position=F('feed_items__recipe'))
+        fields = self.get_fieldset()
+        deferred = DEFERRABLE_COLUMNS - model_fields(fields, RECIPE_COLUMNS)
+        if deferred:
+            queryset = queryset.defer(*deferred)
+        if 'author' not in fields:
+            return queryset
+        queryset = queryset.select_related('author')
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset
+        return queryset.annotate(author_is_subscribed=Exists(
+            UserSubscription.objects.filter(person_id=user,
+                                            sub_id=OuterRef('author'))))
+
+    @action(
+        detail=False,
+        methods=('get', ),
+        permission_classes=(IsAuthenticated, ),
+        url_path='feed',
+        pagination_class=FeedPagination
+    )
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые первыми."""
+        if self.paginator.cursor_query_param not in request.query_params:
+            pull(request.user)
+        return self.list(request)
+
     @action(
         detail=True,
         methods=('get', ),
@@ -76,6 +169,7 @@ class RecipeViewSet(ModelViewSet, FilterModelMixin):
         permission_classes=(IsAuthenticated, ),
         url_path='favorite'
     )
+    @transaction.atomic
     def favorite(self, request, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
         recipe_fav, created = UserRecipeLists.objects.get_or_create(
@@ -102,6 +196,7 @@ class RecipeViewSet(ModelViewSet, FilterModelMixin):
         permission_classes=(IsAuthenticated, ),
         url_path='shopping_cart'
     )
+    @transaction.atomic
     def shopping_cart(self, request, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
         recipe_fav, created = UserRecipeLists.objects.get_or_create(
@@ -126,47 +221,129 @@ class RecipeViewSet(ModelViewSet, FilterModelMixin):
         detail=False,
         methods=('get', ),
         permission_classes=(IsAuthenticated, ),
-        url_path='download_shopping_cart'
+        url_path='download_shopping_cart',
+        renderer_classes=(PDFRenderer, JSONRenderer, PlainTextRenderer,
+                          CSVRenderer)
     )
     def download_shopping_cart(self, request,):
-        ingredients = (
-            request.user
-            .recipes_list
-            .filter(is_in_shopping_cart=True)
-            .prefetch_related('recipe__recipe_ingredients')
-            .annotate(name=F('recipe__recipe_ingredients__ingredient__name'),
-                      measurement_unit=F('recipe__recipe_ingredients__'
-                                         'ingredient__measurement_unit'))
-            .values('name', 'measurement_unit')
-            .annotate(amount=Sum('recipe__recipe_ingredients__amount')))
-        if ingredients.exists() is False:
+        rows = self.shopping_list_rows(request.user).iterator()
+        first = next(rows, None)
+        if first is None:
             return Response({'errors': 'В списке покупок пусто'},
                             status=status.HTTP_404_NOT_FOUND)
-        else:
-            app_path = path.realpath(path.dirname(__file__))
-            font_path = path.join(app_path, 'fonts/DejaVuSerif.ttf')
-            pdfmetrics.registerFont(TTFont('DejaVuSerif', font_path))
-            buffer = io.BytesIO()
-            c = canvas.Canvas(buffer, pagesize=A4)
-            textobject = c.beginText()
-            textobject.setTextOrigin(inch, TEXT_ORIGIN_SIZE * inch)
-            textobject.setFont('DejaVuSerif', FONT_SIZE)
-            for ingr in ingredients:
-                textobject.textLine(ingr['name'] + ' ('
-                                    + ingr['measurement_unit']
-                                    + ') - ' + str(ingr['amount']))
-            c.drawText(textobject)
-            c.showPage()
-            c.save()
-            buffer.seek(0)
-            return FileResponse(buffer, as_attachment=True,
-                                filename='shopping_cart.pdf')
+        renderer = request.accepted_renderer
+        content = SHOPPING_LIST_FORMATS[renderer.format](
+            chain((first, ), rows))
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(content, content_type=content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{renderer.format}"')
+        if isinstance(content, ShoppingListPDF):
+            response['Server-Timing'] = server_timing(
+                {'font': content.timings['font']})
+        return response
+
+    @download_shopping_cart.mapping.post
+    def start_shopping_cart_job(self, request):
+        ingredients = list(self.shopping_list_rows(request.user))
+        if not ingredients:
+            return Response({'errors': 'В списке покупок пусто'},
+                            status=status.HTTP_404_NOT_FOUND)
+        job, job_status = pdf_jobs.submit(request.user.id, ingredients)
+        location = reverse('recipes-shopping-cart-job', kwargs={'job': job},
+                           request=request)
+        return Response(
+            {'id': job, 'status': job_status, 'url': location},
+            status=(status.HTTP_200_OK if job_status == pdf_jobs.DONE
+                    else status.HTTP_202_ACCEPTED),
+            headers={'Location': location})
+
+    @action(
+        detail=False,
+        methods=('get', ),
+        permission_classes=(IsAuthenticated, ),
+        url_path=r'download_shopping_cart/(?P<job>[0-9a-f]{64})',
+        url_name='shopping-cart-job'
+    )
+    def shopping_cart_job(self, request, job):
+        # Задачи лежат в каталоге владельца: чужой id здесь не найдётся.
+        job_status = pdf_jobs.job_status(request.user.id, job)
+        if job_status == pdf_jobs.DONE:
+            path = pdf_jobs.result_path(request.user.id, job)
+            return FileResponse(open(path, 'rb'),
+                                as_attachment=True,
+                                filename='shopping_cart.pdf',
+                                content_type='application/pdf')
+        if job_status == pdf_jobs.PENDING:
+            return Response({'id': job, 'status': job_status},
+                            status=status.HTTP_202_ACCEPTED,
+                            headers={'Retry-After': '1'})
+        return Response({'errors': 'Задача не найдена'},
+                        status=status.HTTP_404_NOT_FOUND)
+
+    @staticmethod
+    def shopping_list_rows(user):
+        return user.shopping_list.values(
+            'amount', name=F('ingredient__name'),
+            measurement_unit=F('ingredient__measurement_unit'))
+
+    @action(
+        detail=False,
+        methods=('get', ),
+        permission_classes=(IsAdminUser, ),
+        url_path='export',
+        renderer_classes=(NDJSONRenderer, JSONRenderer)
+    )
+    def export_ndjson(self, request):
+        response = StreamingHttpResponse(
+            export_recipes(), content_type=NDJSONRenderer.media_type)
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.ndjson"')
+        return response
+
+    @action(
+        detail=False,
+        methods=('post', ),
+        permission_classes=(IsAdminUser, ),
+        url_path='import'
+    )
+    def import_ndjson(self, request):
+        """Тело запроса — NDJSON; читается построчно, не целиком."""
+        lines = iter(request.stream.readline, b'') if request.stream else ()
+        report = import_recipes(lines)
+        return Response(report.as_dict(), status=(
+            status.HTTP_201_CREATED if report.created
+            else status.HTTP_400_BAD_REQUEST))
+
+    @action(
+        detail=False,
+        methods=('get', ),
+        permission_classes=(IsAuthenticated, ),
+        url_path='shopping_list'
+    )
+    def shopping_list(self, request):
+        serializer = self.get_serializer(
+            request.user.shopping_list.select_related('ingredient'),
+            many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (self.action in ('download_shopping_cart',
+                            'start_shopping_cart_job', 'export_ndjson')
+                and isinstance(response, Response)):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in READ_ACTIONS:
             return RecipeListSerializer
         if self.action == 'favorite' or self.action == 'shopping_cart':
             return FavoriteRecipeSerializer
         if self.action == 'download_shopping_cart':
             return DownloadShoppingCartSerializer
+        if self.action == 'shopping_list':
+            return ShoppingListSerializer
         return super().get_serializer_class()
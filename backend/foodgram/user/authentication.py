@@ -0,0 +1,166 @@
+"""Аутентификация по токену с кэшем.
+
+Для чтения (GET, HEAD, OPTIONS) токен ищется сначала в ограниченном
+LRU внутри процесса, затем в общем кэше Django и только потом в БД.
+Запросы на запись всегда читают токен и пользователя из БД: снимок
+из кэша может отставать, и его сохранение вернуло бы в строку старые
+значения. Запись о токене сбрасывается сигналами (user.signals) после
+коммита: при выходе, смене пароля, блокировке и любом другом
+сохранении пользователя, в том числе из админки. Другие процессы
+узнают об изменении не позже AUTH_TOKEN_CACHE_TTL секунд — столько
+живёт запись в их локальном LRU. Общий кэш используется, только если
+CACHE_BACKEND действительно общий для процессов.
+
+В кэш кладётся не экземпляр пользователя, а словарь из SNAPSHOT_FIELDS:
+хеш пароля и права в нём не хранятся и при обращении дочитываются
+из БД как отложенные поля.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.permissions import SAFE_METHODS
+
+from recipes.cache_stats import HitCounter
+from recipes.fragments import is_shared_cache
+
+User = get_user_model()
+
+KEY_PREFIX = 'auth-token'
+STATS = ('local', 'shared', 'miss')
+# Поля, которые читают проверки доступа и ответы на чтение.
+SNAPSHOT_FIELDS = ('id', 'email', 'username', 'first_name', 'last_name',
+                   'avatar', 'is_active', 'is_staff', 'is_superuser',
+                   'recipes_count', 'subscribers_count')
+USER_FIELDS = [field for field in User._meta.concrete_fields
+               if field.attname in SNAPSHOT_FIELDS]
+
+
+class LRU:
+    """Потокобезопасный словарь с ограниченным размером и TTL."""
+
+    def __init__(self, size, ttl):
+        self.size = size
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value, time.monotonic() + self.ttl
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+
+local_tokens = LRU(settings.AUTH_TOKEN_CACHE_SIZE,
+                   settings.AUTH_TOKEN_CACHE_TTL)
+stats = HitCounter(KEY_PREFIX, STATS)
+
+
+def shared_key(key):
+    # Сам токен в ключ кэша не попадает.
+    return f'{KEY_PREFIX}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def shared_ttl():
+    """Срок жизни токена в общем кэше; 0, если кэш только у процесса."""
+    return settings.AUTH_TOKEN_SHARED_TTL if is_shared_cache() else 0
+
+
+def hit_rate():
+    """Попадания в локальный и общий кэш, промахи и доля попаданий."""
+    totals = stats.totals()
+    local, shared, misses = (totals[name] for name in STATS)
+    total = local + shared + misses
+    return local, shared, misses, (local + shared) / total if total else 0
+
+
+def forget_tokens(keys):
+    for key in keys:
+        local_tokens.pop(key)
+    if shared_ttl():
+        cache.delete_many([shared_key(key) for key in keys])
+
+
+def snapshot(token):
+    """Словарь для кэша: токен и поля пользователя из SNAPSHOT_FIELDS."""
+    return {
+        'key': token.key,
+        'created': token.created,
+        'user': [field.get_prep_value(field.value_from_object(token.user))
+                 for field in USER_FIELDS],
+    }
+
+
+def restore(model, data):
+    """Новые экземпляры токена и пользователя для каждого запроса."""
+    using = router.db_for_read(User)
+    user = User.from_db(using, [field.attname for field in USER_FIELDS],
+                        data['user'])
+    token = model.from_db(using, ['key', 'user_id', 'created'],
+                          [data['key'], user.pk, data['created']])
+    token.user = user
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication, которой не нужен запрос к БД на каждое чтение."""
+    cached = True
+
+    def authenticate(self, request):
+        self.cached = request.method in SAFE_METHODS
+        return super().authenticate(request)
+
+    def authenticate_credentials(self, key):
+        if not self.cached:
+            return self.load(key)
+        data = local_tokens.get(key)
+        if data is not None:
+            stats.count('local')
+        elif shared_ttl():
+            data = cache.get(shared_key(key))
+            stats.count('shared' if data is not None else 'miss')
+        else:
+            stats.count('miss')
+        if data is None:
+            return self.load(key)
+        token = restore(self.get_model(), data)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        local_tokens.set(key, data)
+        return token.user, token
+
+    def load(self, key):
+        """Читает токен из БД и обновляет им кэш."""
+        user, token = super().authenticate_credentials(key)
+        data = snapshot(token)
+        if shared_ttl():
+            cache.set(shared_key(key), data, shared_ttl())
+        local_tokens.set(key, data)
+        return user, token
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from user.authentication import hit_rate
+
+
+class Command(BaseCommand):
+    help = 'Show auth token cache hit rate'
+
+    def handle(self, *args, **options):
+        local, shared, misses, rate = hit_rate()
+        self.stdout.write(f'Local hits: {local}, shared hits: {shared}, '
+                          f'misses: {misses}, hit rate: {rate:.1%}')
@@ -0,0 +1,26 @@
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def remove_duplicates(apps, schema_editor):
+    UserSubscription = apps.get_model('user', 'UserSubscription')
+    rows = (UserSubscription.objects
+            .order_by()
+            .values('person_id', 'sub_id')
+            .annotate(keep_id=Min('id'), total=Count('id'))
+            .filter(total__gt=1))
+    for row in rows:
+        (UserSubscription.objects
+         .filter(person_id=row['person_id'], sub_id=row['sub_id'])
+         .exclude(id=row['keep_id']).delete())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0003_alter_usersubscription_options'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2 on 2026-10-18 19:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0004_remove_duplicates'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='usersubscription',
+            constraint=models.UniqueConstraint(fields=('person_id', 'sub_id'), name='unique_person_sub'),
+        ),
+    ]
@@ -1,8 +1,11 @@
 from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
 
+from recipes.model_mixins import CounterFieldsMixin
+from recipes.storage import content_storage
 
-class User(AbstractUser):
+
+class User(CounterFieldsMixin, AbstractUser):
     """Пользователи."""
     email = models.EmailField(max_length=254, unique=True)
     username = models.CharField(max_length=150, unique=True)
@@ -10,12 +13,18 @@ class User(AbstractUser):
     last_name = models.CharField(max_length=150)
     avatar = models.ImageField(
         upload_to='user/images/',
+        storage=content_storage,
         null=True,
         blank=True,
         default=None
     )
     password = models.CharField(max_length=150)
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов', default=0, editable=False)
+    subscribers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков', default=0, editable=False)
 
+    counter_fields = ('recipes_count', 'subscribers_count')
     objects = UserManager()
 
     USERNAME_FIELD = 'email'
@@ -40,6 +49,10 @@ class UserSubscription(models.Model):
         verbose_name = 'Подпика'
         verbose_name_plural = 'Подписки'
         ordering = ('sub_id', )
+        constraints = (
+            models.UniqueConstraint(fields=('person_id', 'sub_id'),
+                                    name='unique_person_sub'),
+        )
 
     def __str__(self):
         return f'{self.sub_id}'
@@ -1,7 +1,189 @@
-from rest_framework.pagination import PageNumberPagination
+import binascii
+import json
+import math
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+# Целые в курсоре должны помещаться в bigint любой СУБД.
+MAX_INTEGER = 2 ** 63 - 1
+
+
+def reverse_field(field):
+    return field[1:] if field.startswith('-') else f'-{field}'
+
+
+def ordering_field(queryset, name):
+    """Поле модели или аннотации, по которому идёт порядок."""
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    try:
+        return queryset.model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def valid_value(value):
+    # NULL сравнением в after() не найти, bool и словари в курсор
+    # не пишутся; с ними запрос упал бы в ORM или в БД.
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, int):
+        return abs(value) <= MAX_INTEGER
+    if isinstance(value, float):
+        return math.isfinite(value)
+    return isinstance(value, str)
+
+
+def after(ordering, position):
+    """Условие «строка идёт после position» для порядка ordering.
+
+    Для (a, b) это a > x OR (a = x AND b > y): сравнение кортежей,
+    которое БД выполняет по составному индексу.
+    """
+    condition = Q()
+    for index in reversed(range(len(ordering))):
+        field = ordering[index].lstrip('-')
+        lookup = 'lt' if ordering[index].startswith('-') else 'gt'
+        step = Q(**{f'{field}{LOOKUP_SEP}{lookup}': position[index]})
+        if index < len(ordering) - 1:
+            step |= Q(**{field: position[index]}) & condition
+        condition = step
+    return condition
+
+
+class KeysetPagination(BasePagination):
+    """Выдача по курсору, который хранит значения всех полей порядка.
+
+    Поля ordering вместе должны однозначно задавать строку: тогда
+    страница выбирается одним условием по ключу, без OFFSET.
+    """
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 6
+    cursor_query_param = 'cursor'
+    ordering = None
+    invalid_cursor_message = _('Invalid cursor')
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering or view.cursor_ordering
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            position, reverse = cursor['p'], bool(cursor['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or (
+                len(position) != len(self.ordering_fields)):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def clean_position(self, queryset, position):
+        """Приводит значения курсора к типам полей порядка."""
+        cleaned = []
+        for name, value in zip(self.ordering_fields, position):
+            if not valid_value(value):
+                raise NotFound(self.invalid_cursor_message)
+            field = ordering_field(queryset, name.lstrip('-'))
+            if field is None:
+                cleaned.append(value)
+                continue
+            try:
+                cleaned.append(field.get_prep_value(field.to_python(value)))
+            except (ValidationError, ValueError, TypeError):
+                raise NotFound(self.invalid_cursor_message)
+        return cleaned
+
+    def encode_cursor(self, instance, reverse):
+        position = [getattr(instance, field.lstrip('-'))
+                    for field in self.ordering_fields]
+        encoded = urlsafe_b64encode(json.dumps(
+            {'p': position, 'r': int(reverse)}).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.ordering_fields = tuple(
+            self.get_ordering(request, queryset, view))
+        cursor = self.decode_cursor(request)
+        reverse = cursor is not None and cursor[1]
+        ordering = self.ordering_fields
+        if reverse:
+            ordering = tuple(reverse_field(field) for field in ordering)
+        queryset = queryset.order_by(*ordering)
+        if cursor is not None:
+            queryset = queryset.filter(after(
+                ordering, self.clean_position(queryset, cursor[0])))
+        page_size = self.get_page_size(request)
+        page = list(queryset[:page_size + 1])
+        has_more = len(page) > page_size
+        del page[page_size:]
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = page
+        return page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
 
 
 class UsersPagination(PageNumberPagination):
+    """Постраничная выдача; с параметром cursor — выдача по курсору."""
     page_size = 6
     page_size_query_param = 'limit'
     max_page_size = 6
+    cursor_query_param = 'cursor'
+    cursor_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (getattr(view, 'cursor_ordering', None)
+                and self.cursor_query_param in request.query_params):
+            self.cursor_pagination = KeysetPagination()
+            return self.cursor_pagination.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination is not None:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
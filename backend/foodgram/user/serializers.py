@@ -3,15 +3,43 @@ import base64
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
+from django.db.models import F, Manager, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
-from rest_framework.validators import UniqueValidator, UniqueTogetherValidator
+from rest_framework.validators import UniqueValidator
 
+from recipes.fieldsets import SparseFieldsetMixin
+from recipes.models import Recipe
+from recipes.images import (AVATAR_VARIANTS, RECIPE_VARIANTS, strip_metadata,
+                            variant_urls)
 from user.models import UserSubscription
 
 User = get_user_model()
 
 
+def followed_ids(request):
+    """id авторов, на которых подписан пользователь запроса.
+
+    Загружаются одним запросом при первом обращении и хранятся
+    на запросе, поэтому общие для всех вложенных сериализаторов.
+    """
+    if request.user.is_anonymous:
+        return frozenset()
+    if not hasattr(request, '_followed_ids'):
+        request._followed_ids = frozenset(
+            UserSubscription.objects.filter(
+                person_id=request.user).order_by().values_list(
+                    'sub_id', flat=True))
+    return request._followed_ids
+
+
+def forget_followed(request):
+    """Сбрасывает followed_ids после изменения подписок."""
+    request.__dict__.pop('_followed_ids', None)
+
+
 class Base64ImageField(serializers.ImageField):
 
     def to_internal_value(self, data):
@@ -21,7 +49,7 @@ class Base64ImageField(serializers.ImageField):
 
             data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
 
-        return super().to_internal_value(data)
+        return strip_metadata(super().to_internal_value(data))
 
 
 class UserAvatarSerializer(serializers.ModelSerializer):
@@ -33,11 +61,11 @@ class UserAvatarSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         instance.avatar = validated_data.get('avatar', instance.avatar)
-        instance.save()
+        instance.save(update_fields=('avatar', ))
         return instance
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(SparseFieldsetMixin, UserSerializer):
     email = serializers.EmailField(
         required=True,
         max_length=254,
@@ -63,6 +91,7 @@ class CustomUserSerializer(UserSerializer):
         'get_avatar_url',
         read_only=True,
     )
+    avatar_variants = serializers.SerializerMethodField(read_only=True)
     is_subscribed = serializers.SerializerMethodField(
         'get_is_subscribed',
         read_only=True,
@@ -71,7 +100,7 @@ class CustomUserSerializer(UserSerializer):
     class Meta:
         model = User
         fields = ('email', 'username', 'first_name', 'last_name', 'password',
-                  'avatar', 'id', 'is_subscribed', )
+                  'avatar', 'avatar_variants', 'id', 'is_subscribed', )
         extra_kwargs = {'password': {'write_only': True}, }
 
     def create(self, validated_data):
@@ -90,11 +119,56 @@ class CustomUserSerializer(UserSerializer):
             return obj.avatar.url
         return None
 
+    def get_avatar_variants(self, obj):
+        return variant_urls(obj.avatar.name, AVATAR_VARIANTS)
+
     def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        if user.is_anonymous:
-            return False
-        return user.user_person.filter(sub_id=obj).exists()
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
+        return obj.id in followed_ids(self.context['request'])
+
+
+def recipes_limit(request):
+    try:
+        limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return limit if limit >= 0 else None
+
+
+def recipe_previews(author_ids, limit=None):
+    """Первые limit рецептов каждого автора одним запросом.
+
+    Отбор делает ROW_NUMBER() с разбиением по автору, поэтому число
+    запросов не зависит ни от числа авторов, ни от limit.
+    """
+    recipes = Recipe.objects.filter(author__in=author_ids)
+    if limit is not None:
+        ranked = recipes.order_by().annotate(preview_rank=Window(
+            RowNumber(), partition_by=F('author'),
+            order_by=(F('name').asc(), F('id').asc()))).values(
+                'id', 'preview_rank')
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.filter(pk__in=RawSQL(
+            f'SELECT id FROM ({sql}) ranked WHERE preview_rank <= %s',
+            (*params, limit)))
+    previews = {author_id: [] for author_id in author_ids}
+    for recipe in recipes.order_by('name', 'id').values(
+            'author', 'id', 'name', 'image', 'cooking_time'):
+        author_id = recipe.pop('author')
+        recipe['image_variants'] = variant_urls(recipe['image'],
+                                                RECIPE_VARIANTS)
+        recipe['image'] = settings.MEDIA_URL + recipe['image']
+        previews[author_id].append(recipe)
+    return previews
+
+
+class SubscribtionPageSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, Manager) else data)
+        self.child.load_recipes(users)
+        return super().to_representation(users)
 
 
 class SubscribtionListSerializer(CustomUserSerializer):
@@ -106,52 +180,28 @@ class SubscribtionListSerializer(CustomUserSerializer):
         'get_recipes_count',
         read_only=True,
     )
+    subscribers_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
         fields = ('email', 'username', 'first_name', 'last_name',
-                  'avatar', 'id', 'is_subscribed', 'recipes', 'recipes_count')
-
-    def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = int(request.query_params.get('recipes_limit'))
-        recipes = obj.recipes.values('id',
-                                     'name',
-                                     'image',
-                                     'cooking_time').all()[:limit]
-        for recipe in recipes:
-            recipe['image'] = settings.MEDIA_URL + recipe['image']
-        return recipes
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.all().count()
+                  'avatar', 'avatar_variants', 'id', 'is_subscribed',
+                  'recipes', 'recipes_count', 'subscribers_count')
+        list_serializer_class = SubscribtionPageSerializer
 
+    previews = None
 
-class SubscribtionCreateSerializer(serializers.ModelSerializer):
-    person_id = serializers.PrimaryKeyRelatedField(
-        queryset=User.objects.all())
-    sub_id = serializers.PrimaryKeyRelatedField(
-        queryset=User.objects.all())
+    def load_recipes(self, users):
+        """Загружает превью рецептов сразу для всей страницы авторов."""
+        if 'recipes' in self.fields:
+            self.previews = recipe_previews(
+                [user.id for user in users],
+                recipes_limit(self.context['request']))
 
-    class Meta:
-        fields = '__all__'
-        model = UserSubscription
-        validators = [
-            UniqueTogetherValidator(
-                queryset=UserSubscription.objects.all(),
-                fields=['sub_id', 'person_id'],
-                message='Вы уже подписаны на данного человека'
-            )
-        ]
-
-    def validate(self, data):
-        user = data['person_id']
-        current_sub = data['sub_id']
-        if user == current_sub:
-            raise serializers.ValidationError(
-                ['Подписка на себя невозможна'])
-        return data
+    def get_recipes(self, obj):
+        if self.previews is None or obj.id not in self.previews:
+            self.load_recipes([obj])
+        return self.previews[obj.id]
 
-    def update(self, instance, validated_data):
-        instance.delete()
-        return
+    def get_recipes_count(self, obj):
+        return obj.recipes_count
@@ -0,0 +1,79 @@
+"""Подписка и отписка одним запросом к БД.
+
+Вставка идёт с ON CONFLICT (person_id, sub_id) DO NOTHING, удаление —
+одним DELETE; о результате говорит число затронутых строк, поэтому
+из двух одновременных запросов успешным окажется ровно один. Конфликт
+подавляется только по уникальной паре: ошибки внешних ключей и прочие
+нарушения целостности по-прежнему поднимаются. Сигналы модели
+отправляются вручную и только при реальном изменении: на них завязаны
+счётчик подписчиков, лента и версии таблиц.
+"""
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models.signals import post_delete, post_save
+
+from user.models import UserSubscription
+
+ON_CONFLICT_VENDORS = ('postgresql', 'sqlite')
+
+
+def _columns(connection):
+    meta = UserSubscription._meta
+    quote = connection.ops.quote_name
+    return (quote(meta.db_table),
+            quote(meta.get_field('person_id').column),
+            quote(meta.get_field('sub_id').column))
+
+
+def _insert(subscription, using):
+    """Вставляет строку; False, если такая подписка уже есть."""
+    connection = connections[using]
+    if connection.vendor in ON_CONFLICT_VENDORS:
+        table, person, sub = _columns(connection)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} ({person}, {sub}) VALUES (%s, %s) '
+                f'ON CONFLICT ({person}, {sub}) DO NOTHING',
+                (subscription.person_id_id, subscription.sub_id_id))
+            return cursor.rowcount == 1
+    # MySQL и прочие: ON DUPLICATE KEY UPDATE не подходит — с флагом
+    # CLIENT_FOUND_ROWS, который ставит Django, он сообщает об одной
+    # строке и при вставке, и при повторе. bulk_create не шлёт сигналов.
+    try:
+        with transaction.atomic(using=using):
+            UserSubscription.objects.using(using).bulk_create(
+                [subscription])
+    except IntegrityError:
+        if UserSubscription.objects.using(using).filter(
+                person_id=subscription.person_id_id,
+                sub_id=subscription.sub_id_id).exists():
+            return False
+        raise
+    return True
+
+
+def add_subscription(user_id, author_id):
+    """Подписывает пользователя; False, если подписка уже была."""
+    using = router.db_for_write(UserSubscription)
+    subscription = UserSubscription(person_id_id=user_id, sub_id_id=author_id)
+    created = _insert(subscription, using)
+    if created:
+        post_save.send(UserSubscription, instance=subscription, created=True,
+                       update_fields=None, raw=False, using=using)
+    return created
+
+
+def remove_subscription(user_id, author_id):
+    """Отписывает пользователя; False, если подписки не было."""
+    using = router.db_for_write(UserSubscription)
+    connection = connections[using]
+    table, person, sub = _columns(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {person} = %s '
+                       f'AND {sub} = %s', (user_id, author_id))
+        deleted = cursor.rowcount > 0
+    if deleted:
+        post_delete.send(UserSubscription,
+                         instance=UserSubscription(person_id_id=user_id,
+                                                   sub_id_id=author_id),
+                         using=using)
+    return deleted
@@ -0,0 +1,79 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from recipes.tests.utils import CacheTestCase, client_for, make_user
+from user.authentication import hit_rate, local_tokens, shared_ttl
+from user.models import User
+
+
+class CachedTokenAuthenticationTest(CacheTestCase):
+    """Кэш токенов не отдаёт устаревшего пользователя на запись."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('user')
+
+    def setUp(self):
+        super().setUp()
+        local_tokens.items.clear()
+        self.client = client_for(self.user)
+        # Первый запрос кладёт снимок пользователя в кэш.
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+
+    def token_queries(self, request):
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.assertLess(response.status_code, 400)
+        return [query for query in queries.captured_queries
+                if 'authtoken_token' in query['sql']]
+
+    def test_read_uses_cache(self):
+        self.assertEqual(self.token_queries(
+            lambda: self.client.get('/api/users/me/')), [])
+
+    def test_write_reloads_user(self):
+        # Изменение из другого процесса, о котором этот ещё не знает.
+        User.objects.filter(pk=self.user.pk).update(first_name='Новое')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/users/set_password/', {
+                'current_password': 'Pass-12345',
+                'new_password': 'Other-Pass-678'}, format='json')
+        self.assertEqual(response.status_code, 204)
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.first_name, 'Новое')
+        self.assertTrue(user.check_password('Other-Pass-678'))
+
+    def test_logout_invalidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_deactivation_invalidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            user = User.objects.get(pk=self.user.pk)
+            user.is_active = False
+            user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_snapshot_without_password(self):
+        data, = (value for value, _ in local_tokens.items.values())
+        self.assertNotIn(self.user.password, repr(data))
+        user = self.client.get('/api/users/me/').wsgi_request.user
+        self.assertIn('password', user.get_deferred_fields())
+        # Отложенное поле дочитывается из БД.
+        self.assertTrue(user.check_password('Pass-12345'))
+
+    @override_settings(AUTH_TOKEN_SHARED_TTL=300)
+    def test_stats_on_process_cache(self):
+        self.assertEqual(shared_ttl(), 0)
+        local, shared, misses, _ = hit_rate()
+        self.client.get('/api/users/me/')
+        self.assertEqual(hit_rate()[:3], (local + 1, shared, misses))
+        out = StringIO()
+        call_command('token_cache_stats', stdout=out)
+        self.assertIn(f'Local hits: {local + 1}', out.getvalue())
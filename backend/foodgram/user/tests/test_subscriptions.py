@@ -0,0 +1,88 @@
+from unittest import mock
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from recipes.tests.utils import CacheTestCase, client_for, cursor, make_user
+from user import subscriptions
+from user.models import User, UserSubscription
+
+
+class SubscribeTest(CacheTestCase):
+    """Коды ответа и тела подписки и отписки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = make_user('user')
+        cls.author = make_user('author')
+
+    def setUp(self):
+        super().setUp()
+        self.client = client_for(self.user)
+
+    def url(self, pk):
+        return f'/api/users/{pk}/subscribe/'
+
+    def subscribers(self):
+        return User.objects.get(pk=self.author.pk).subscribers_count
+
+    def test_subscribe(self):
+        response = self.client.post(self.url(self.author.id))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['id'], self.author.id)
+        self.assertTrue(response.data['is_subscribed'])
+        self.assertEqual(self.subscribers(), 1)
+
+    def test_self(self):
+        response = self.client.post(self.url(self.user.id))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {
+            'non_field_errors': ['Подписка на себя невозможна']})
+        self.assertFalse(UserSubscription.objects.exists())
+
+    def test_duplicate(self):
+        self.client.post(self.url(self.author.id))
+        response = self.client.post(self.url(self.author.id))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {
+            'non_field_errors': ['Вы уже подписаны на данного человека']})
+        self.assertEqual(self.subscribers(), 1)
+
+    def test_missing_user(self):
+        missing = self.author.id + 100
+        for method in (self.client.post, self.client.delete):
+            with self.subTest(method=method.__name__):
+                self.assertEqual(method(self.url(missing)).status_code, 404)
+
+    def test_unsubscribe(self):
+        self.client.post(self.url(self.author.id))
+        response = self.client.delete(self.url(self.author.id))
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.subscribers(), 0)
+
+    def test_unsubscribe_not_subscribed(self):
+        response = self.client.delete(self.url(self.author.id))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {
+            'errors': 'Вы не подписаны на данного пользователя'})
+
+    def test_malformed_cursor(self):
+        self.client.post(self.url(self.author.id))
+        for position in ([{'a': 1}], ['x'], [None]):
+            with self.subTest(position=position):
+                response = self.client.get(
+                    f'/api/users/subscriptions/?cursor={cursor(position)}')
+                self.assertEqual(response.status_code, 404)
+        response = self.client.get(
+            f'/api/users/subscriptions/?cursor={cursor([0])}')
+        self.assertEqual([user['id'] for user in response.data['results']],
+                         [self.author.id])
+
+    def test_fallback_insert(self):
+        # Путь для СУБД без ON CONFLICT, например MySQL.
+        with mock.patch.object(connections[DEFAULT_DB_ALIAS], 'vendor',
+                               'other'):
+            self.assertTrue(subscriptions.add_subscription(
+                self.user.id, self.author.id))
+            self.assertFalse(subscriptions.add_subscription(
+                self.user.id, self.author.id))
+        self.assertEqual(self.subscribers(), 1)
@@ -1,12 +1,17 @@
 from django.urls import include, path
+from rest_framework.routers import DefaultRouter
 
-from user.views import Subscriptions, set_user_avatar, subscribe
+from user.views import (CustomUserViewSet, Subscriptions, set_user_avatar,
+                        subscribe)
+
+router = DefaultRouter()
+router.register('users', CustomUserViewSet, basename='user')
 
 urlpatterns = [
     path('users/subscriptions/', Subscriptions.as_view(),
          name='subscriptions'),
     path('users/me/avatar/', set_user_avatar, name='avatar'),
     path('users/<int:pk>/subscribe/', subscribe, name='subscribe'),
-    path('', include('djoser.urls')),
+    path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,58 +1,92 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import BooleanField, Value
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
+from recipes.conditional import ConditionalGetMixin
+from recipes.fieldsets import model_fields, requested_fields
 from user.pagination import UsersPagination
 from user.serializers import (CustomUserSerializer, UserAvatarSerializer,
-                              SubscribtionCreateSerializer,
-                              SubscribtionListSerializer)
+                              SubscribtionListSerializer, forget_followed)
+from user.subscriptions import add_subscription, remove_subscription
 
 User = get_user_model()
+USER_COLUMNS = {
+    'email': ('email', ),
+    'username': ('username', ),
+    'first_name': ('first_name', ),
+    'last_name': ('last_name', ),
+    'avatar': ('avatar', ),
+    'avatar_variants': ('avatar', ),
+}
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(ConditionalGetMixin, UserViewSet):
+    version_tables = ('user', 'usersubscription')
+    per_user = True
+    cursor_ordering = ('email', )
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+        fields = requested_fields(self.request,
+                                  CustomUserSerializer.Meta.fields)
+        return queryset.only('id', *self.cursor_ordering,
+                             *model_fields(fields, USER_COLUMNS))
+
 
 @api_view(['POST', 'DELETE'])
 @permission_classes([IsAuthenticated])
+@transaction.atomic
 def subscribe(request, pk):
-    user = get_object_or_404(User, pk=pk)
+    if request.method == 'POST' and pk == request.user.id:
+        return Response({api_settings.NON_FIELD_ERRORS_KEY: [
+            'Подписка на себя невозможна']},
+            status=status.HTTP_400_BAD_REQUEST)
     if request.method == 'POST':
-        serializer = SubscribtionCreateSerializer(
-            data={'person_id': request.user.id, 'sub_id': pk},
-            context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        serializer = SubscribtionListSerializer(user,
+        author = get_object_or_404(User, pk=pk)
+        if not add_subscription(request.user.id, pk):
+            return Response({api_settings.NON_FIELD_ERRORS_KEY: [
+                'Вы уже подписаны на данного человека']},
+                status=status.HTTP_400_BAD_REQUEST)
+        forget_followed(request)
+        # Строка автора прочитана до вставки: счётчик правим на месте.
+        author.subscribers_count += 1
+        author.is_subscribed = True
+        serializer = SubscribtionListSerializer(author,
                                                 context={'request': request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
-    if request.method == 'DELETE':
-        sub = request.user.user_person.filter(sub_id=pk)
-        if sub.exists():
-            sub.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-
-        return Response({'errors': ('Вы не подписаны на '
-                                    'данного пользователя')},
-                        status=status.HTTP_400_BAD_REQUEST)
+    if remove_subscription(request.user.id, pk):
+        forget_followed(request)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    get_object_or_404(User, pk=pk)
+    return Response({'errors': ('Вы не подписаны на '
+                                'данного пользователя')},
+                    status=status.HTTP_400_BAD_REQUEST)
 
 
-class Subscriptions(generics.ListAPIView):
+class Subscriptions(ConditionalGetMixin, generics.ListAPIView):
+    version_tables = ('recipe', 'user', 'usersubscription')
+    per_user = True
+    cursor_ordering = ('id', )
     pagination_class = UsersPagination
     serializer_class = SubscribtionListSerializer
 
     def get_queryset(self):
-        users = self.request.user.user_person.all()
-        data_user = []
-        for user in users:
-            data_user.append(user.sub_id)
-        return data_user
+        # Список состоит только из подписок, так что is_subscribed
+        # известен заранее и не требует запроса на каждого автора.
+        return User.objects.filter(
+            user_subscription__person_id=self.request.user).annotate(
+                is_subscribed=Value(True, BooleanField())).order_by('id')
 
 
 @api_view(['PUT', 'DELETE'])
@@ -66,6 +100,6 @@ def set_user_avatar(request):
     elif request.method == 'DELETE':
         user = get_object_or_404(User, pk=request.user.id)
         user.avatar = None
-        user.save()
+        user.save(update_fields=('avatar', ))
         return Response(status=status.HTTP_204_NO_CONTENT)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)